@@ -7,6 +7,7 @@ from django.contrib.auth import authenticate
 from rest_framework.permissions import IsAuthenticated
 from .serializers import UserSerializer
 from .models import User
+from .caching import invalidate_users
 
 class RegisterView(APIView):
     def post(self, request):
@@ -26,6 +27,7 @@ class RegisterView(APIView):
                 first_name=data.get('first_name', ''),
                 last_name=data.get('last_name', ''),
             )
+            invalidate_users()
             
             # Generate tokens
             refresh = RefreshToken.for_user(user)
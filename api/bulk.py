@@ -0,0 +1,46 @@
+"""Helpers shared by the bulk creation endpoints.
+
+Bulk endpoints validate every record up front, insert the valid ones with
+``bulk_create`` in one transaction, and answer with one result per input
+record, in input order: ``{"status": 201, "data": {...}}`` for created
+records and ``{"status": 400, "error": "..."}`` for rejected ones.
+"""
+import json
+
+from django.http import JsonResponse
+
+MAX_BULK_RECORDS = 10000
+# Every user costs one deliberately slow password hash
+MAX_BULK_USERS = 100
+
+
+def parse_bulk_records(request, limit=MAX_BULK_RECORDS):
+    """Parse a request body holding a non-empty array of at most ``limit`` JSON objects"""
+    records = json.loads(request.body)
+    if not isinstance(records, list) or not records:
+        raise ValueError('Expected a non-empty array of records')
+    if len(records) > limit:
+        raise ValueError(f'At most {limit} records can be created at once')
+    if not all(isinstance(record, dict) for record in records):
+        raise ValueError('Every record must be an object')
+    return records
+
+
+def created(data):
+    return {'status': 201, 'data': data}
+
+
+def rejected(error):
+    return {'status': 400, 'error': error}
+
+
+def bulk_response(results):
+    """201 when every record was created, 207 when only some were, 400 when none were"""
+    statuses = {result['status'] for result in results}
+    if statuses == {201}:
+        status = 201
+    elif 201 in statuses:
+        status = 207
+    else:
+        status = 400
+    return JsonResponse(results, safe=False, status=status)
@@ -0,0 +1,255 @@
+"""Two-tier cache backend: a per-worker LRU in front of django_redis.
+
+Reads are served from a small in-process LRU/TTL cache when possible and
+fall through to Redis otherwise. Every write (set, add, delete, incr, ...)
+evicts the key locally and publishes it on a Redis pub/sub channel, and a
+listener thread in each worker evicts its own copy when the message arrives.
+The local TTL bounds staleness if a message is ever missed. An eviction
+that arrives while a value is being read from Redis also drops that read's
+local copy (see ``LocalLRU.generation``), so a value invalidated mid-read is
+never kept locally.
+
+Configure it in CACHES with the usual django_redis options plus:
+
+    LOCAL_MAX_ENTRIES     entries kept per worker (default 1024)
+    LOCAL_TTL             seconds a local copy may be served (default 5)
+    INVALIDATION_CHANNEL  pub/sub channel name (default 'cache-invalidation')
+"""
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django_redis.cache import RedisCache
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class LocalLRU:
+    """Thread-safe LRU cache with a fixed per-entry TTL and hit/miss counters"""
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        # Bumped by every eviction; lets readers detect one that landed
+        # between their remote read and their local set
+        self.generation = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                value, expires = item
+                if expires > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return _MISSING
+
+    def set(self, key, value, generation=None):
+        """Store ``value``, unless an eviction happened since ``generation`` was read"""
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete_many(self, keys):
+        with self._lock:
+            self.generation += 1
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else None,
+                'size': len(self._data),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+            }
+
+
+class TwoTierRedisCache(RedisCache):
+    def __init__(self, server, params):
+        super().__init__(server, params)
+        options = params.get('OPTIONS', {})
+        self._local = LocalLRU(options.get('LOCAL_MAX_ENTRIES', 1024), options.get('LOCAL_TTL', 5))
+        self._channel = options.get('INVALIDATION_CHANNEL', 'cache-invalidation')
+        self._listener_pid = None
+        self._listener_lock = threading.Lock()
+        self._origin = None
+
+    # Invalidation -----------------------------------------------------------
+
+    def _ensure_listener(self):
+        """Start the pub/sub listener once per process (again after a fork)"""
+        if self._listener_pid == os.getpid():
+            return
+        with self._listener_lock:
+            if self._listener_pid == os.getpid():
+                return
+            # A forked worker inherits the parent's entries but not its thread
+            self._local.clear()
+            self._origin = uuid.uuid4().hex
+            thread = threading.Thread(target=self._listen, name='cache-invalidation', daemon=True)
+            thread.start()
+            self._listener_pid = os.getpid()
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self.client.get_client(write=False).pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self._channel)
+                # Anything published while we were not subscribed is lost
+                self._local.clear()
+                for message in pubsub.listen():
+                    payload = json.loads(message['data'])
+                    if payload['origin'] == self._origin:
+                        continue
+                    if payload['keys'] is None:
+                        self._local.clear()
+                    else:
+                        self._local.delete_many(payload['keys'])
+            except Exception:
+                logger.warning('Cache invalidation listener disconnected; retrying', exc_info=True)
+                self._local.clear()
+                time.sleep(1)
+
+    def _invalidate(self, local_keys):
+        """Evict ``local_keys`` here and in every other worker (None means all)"""
+        if local_keys is None:
+            self._local.clear()
+        else:
+            self._local.delete_many(local_keys)
+        try:
+            payload = json.dumps({'origin': self._origin, 'keys': local_keys})
+            self.client.get_client(write=True).publish(self._channel, payload)
+        except Exception:
+            logger.warning('Failed to publish cache invalidation', exc_info=True)
+
+    def local_stats(self):
+        """Hit/miss counters of this worker's local tier"""
+        return self._local.stats()
+
+    # Reads ------------------------------------------------------------------
+
+    def get(self, key, default=None, version=None, client=None):
+        self._ensure_listener()
+        local_key = self.make_key(key, version=version)
+        value = self._local.get(local_key)
+        if value is _MISSING:
+            generation = self._local.generation
+            value = super().get(key, default=_MISSING, version=version, client=client)
+            if value is _MISSING:
+                return default
+            self._local.set(local_key, value, generation)
+        return value
+
+    def get_many(self, keys, version=None, client=None, touch=None):
+        """Like RedisCache.get_many; ``touch`` renews (in seconds) the expiry
+        of the keys read from Redis, so keys that keep being read never expire
+        """
+        self._ensure_listener()
+        found = {}
+        remote = []
+        for key in keys:
+            value = self._local.get(self.make_key(key, version=version))
+            if value is _MISSING:
+                remote.append(key)
+            else:
+                found[key] = value
+        if remote:
+            generation = self._local.generation
+            fetched = super().get_many(remote, version=version, client=client)
+            for key, value in fetched.items():
+                self._local.set(self.make_key(key, version=version), value, generation)
+            if touch is not None and fetched:
+                # A local hit skips this, but its copy lives at most LOCAL_TTL
+                # seconds before the next read comes back here
+                with (client or self.client.get_client(write=True)).pipeline(transaction=False) as pipe:
+                    for key in fetched:
+                        pipe.pexpire(self.make_key(key, version=version), int(touch * 1000))
+                    pipe.execute()
+            found.update(fetched)
+        return found
+
+    # Writes -----------------------------------------------------------------
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None, client=None, nx=False, xx=False):
+        self._ensure_listener()
+        result = super().set(key, value, timeout=timeout, version=version, client=client, nx=nx, xx=xx)
+        self._invalidate([self.make_key(key, version=version)])
+        return result
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None, client=None):
+        self._ensure_listener()
+        result = super().set_many(data, timeout=timeout, version=version, client=client)
+        self._invalidate([self.make_key(key, version=version) for key in data])
+        return result
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None, client=None):
+        self._ensure_listener()
+        added = super().add(key, value, timeout=timeout, version=version, client=client)
+        if added:
+            self._invalidate([self.make_key(key, version=version)])
+        return added
+
+    def delete(self, key, version=None, prefix=None, client=None):
+        self._ensure_listener()
+        result = super().delete(key, version=version, prefix=prefix, client=client)
+        self._invalidate([self.make_key(key, version=version)])
+        return result
+
+    def delete_many(self, keys, version=None, client=None):
+        self._ensure_listener()
+        keys = list(keys)
+        result = super().delete_many(keys, version=version, client=client)
+        self._invalidate([self.make_key(key, version=version) for key in keys])
+        return result
+
+    def delete_pattern(self, *args, **kwargs):
+        self._ensure_listener()
+        result = super().delete_pattern(*args, **kwargs)
+        self._invalidate(None)
+        return result
+
+    def incr(self, key, delta=1, version=None, client=None, ignore_key_check=False):
+        self._ensure_listener()
+        result = super().incr(key, delta=delta, version=version, client=client, ignore_key_check=ignore_key_check)
+        self._invalidate([self.make_key(key, version=version)])
+        return result
+
+    def decr(self, key, delta=1, version=None, client=None):
+        self._ensure_listener()
+        result = super().decr(key, delta=delta, version=version, client=client)
+        self._invalidate([self.make_key(key, version=version)])
+        return result
+
+    def clear(self):
+        self._ensure_listener()
+        result = super().clear()
+        self._invalidate(None)
+        return result
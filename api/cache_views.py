@@ -0,0 +1,17 @@
+from django.http import JsonResponse
+from django.views import View
+from django.core.cache import cache
+import os
+
+class CacheStatsView(View):
+    def get(self, request):
+        """Get hit/miss counters of this worker's in-process cache tier"""
+        if not request.user.is_staff:
+            return JsonResponse({'error': 'Staff access required'}, status=403)
+
+        # Only the two-tier backend has a local tier
+        local_stats = getattr(cache, 'local_stats', None)
+        return JsonResponse({
+            'pid': os.getpid(),
+            'local': local_stats() if local_stats else None,
+        })
@@ -0,0 +1,321 @@
+"""Cache helpers shared by the API views and models.
+
+Every cacheable resource has a version number (``products``, ``product:1``,
+``carts``, ``user_carts:3`` ...) that its write paths bump. Versions are
+nanosecond timestamps, so they double as Last-Modified dates, and readers
+derive strong ETags and cache-entry validity from them. Collections cached
+under many keys (e.g. one entry per page) are invalidated by a single bump
+instead of deleting every key; entries built from older versions are
+rebuilt on their next read.
+
+Response bodies are cached as finished, optionally gzip-compressed JSON bytes
+together with the version tag they were built from, so a cache hit is served
+without decoding or re-encoding anything in Python, and a matching
+If-None-Match is answered before the body is even fetched. Rebuilds are
+single-flight: one worker holds a short lease and recomputes while the rest
+keep serving the previous entry.
+"""
+import functools
+import gzip
+import json
+import math
+import random
+import time
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from redis.exceptions import WatchError
+
+
+def _version_key(name):
+    return f'version:{name}'
+
+
+def _version_timeout():
+    # As long as a cache entry lives, counted from the last read. Versions
+    # of resources nobody asks for (or that never exist) then expire instead
+    # of piling up, while one that keeps being read keeps its value, and so
+    # its ETag; one that expires is re-seeded with a newer timestamp, which
+    # retires its entries.
+    return settings.CACHE_TTL + settings.CACHE_STALE_TTL
+
+
+def get_versions(*names):
+    """Return the current versions of ``names``, initialising missing ones"""
+    keys = [_version_key(name) for name in names]
+    found = cache.get_many(keys, touch=_version_timeout())
+    for key in keys:
+        if key not in found:
+            # Seed with a timestamp so a version lost to eviction or expiry
+            # never goes back to a value that older cache entries were built with.
+            cache.add(key, time.time_ns(), _version_timeout())
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+def get_version(name):
+    """Return the current version of ``name``, initialising it if missing"""
+    return get_versions(name)[0]
+
+
+def bump_version(*names):
+    """Invalidate everything cached under the versions of ``names``"""
+    now = time.time_ns()
+    cache.set_many({_version_key(name): now for name in names}, _version_timeout())
+
+
+def accepts_gzip(request):
+    return 'gzip' in request.headers.get('Accept-Encoding', '')
+
+
+def _validators_for(request, tag, compressible):
+    etag = f'"{tag}-gzip"' if compressible and accepts_gzip(request) else f'"{tag}"'
+    return etag, max(int(version) for version in tag.split('.')) // 10 ** 9
+
+
+def get_validators(request, *names, compressible=False):
+    """Return (tag, etag, last_modified) for a response built from ``names``.
+
+    ``tag`` identifies the data, while ``etag`` identifies the exact bytes
+    sent, so it differs between gzip and identity encodings.
+    """
+    tag = '.'.join(str(version) for version in get_versions(*names))
+    return (tag, *_validators_for(request, tag, compressible))
+
+
+def set_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def not_modified(request, etag, last_modified):
+    """Return a 304 response if the client's copy is current, else None"""
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
+
+
+def conditional(*names):
+    """Decorate a view method to answer conditional GETs from resource versions.
+
+    ``names`` are formatted with the view's URL kwargs, e.g. ``'user:{pk}'``.
+    The versions are read before the view runs, so a write that lands while
+    the response is being built produces a new ETag on the next request.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            _, etag, last_modified = get_validators(request, *(name.format(**kwargs) for name in names))
+            response = not_modified(request, etag, last_modified)
+            if response is not None:
+                return response
+            response = method(self, request, *args, **kwargs)
+            if response.status_code == 200:
+                set_validators(response, etag, last_modified)
+            return response
+        return wrapper
+    return decorator
+
+
+class CacheEntry(NamedTuple):
+    body: bytes
+    tag: str
+    gzipped: bool
+    headers: dict
+    # Seconds the rebuild took and the (epoch) time it goes stale; used for
+    # probabilistic early refresh.
+    delta: float
+    expiry: float
+
+
+def encode_entry(data, tag, headers=None, delta=0.0, expiry=0.0):
+    """Encode ``data`` into a CacheEntry holding the finished JSON bytes.
+
+    ``data`` may also be JSON that is already encoded (e.g. aggregated by
+    Postgres), passed as ``bytes``; it is stored as is.
+    """
+    if isinstance(data, bytes):
+        body = data
+    else:
+        body = json.dumps(data, cls=DjangoJSONEncoder, separators=(',', ':')).encode('utf-8')
+    gzipped = len(body) >= settings.CACHE_COMPRESS_MIN_BYTES
+    if gzipped:
+        body = gzip.compress(body, compresslevel=6, mtime=0)
+    return CacheEntry(body, tag, gzipped, headers or {}, delta, expiry)
+
+
+def entry_body(entry):
+    """Return the uncompressed JSON bytes of a cache entry"""
+    return gzip.decompress(entry.body) if entry.gzipped else entry.body
+
+
+def entry_response(request, entry, status=200):
+    """Serve a cache entry, passing gzip bodies through when the client accepts them"""
+    body, gzipped = entry.body, entry.gzipped
+    if gzipped and not accepts_gzip(request):
+        body, gzipped = gzip.decompress(body), False
+    response = HttpResponse(body, status=status, content_type='application/json')
+    if gzipped:
+        response['Content-Encoding'] = 'gzip'
+    response['Vary'] = 'Accept-Encoding'
+    for header, value in entry.headers.items():
+        response[header] = value
+    # Validators come from the entry, which may be a stale copy
+    return set_validators(response, *_validators_for(request, entry.tag, True))
+
+
+def _refresh_due(entry):
+    """XFetch: recompute before expiry with a probability that rises as it nears.
+
+    Entries that were slow to build start refreshing earlier, so one worker
+    usually rebuilds them before they ever go stale.
+    """
+    jitter = -entry.delta * settings.CACHE_EARLY_REFRESH_BETA * math.log(1.0 - random.random())
+    return time.time() + jitter >= entry.expiry
+
+
+def _rebuild_entry(key, tag, build, ttl):
+    started = time.monotonic()
+    data, headers = build()
+    entry = encode_entry(data, tag, headers, time.monotonic() - started, time.time() + ttl)
+    # Keep the entry past its logical expiry so it can be served stale while
+    # a single worker rebuilds it.
+    cache.set(key, entry, ttl + settings.CACHE_STALE_TTL)
+    return entry
+
+
+def _release_lease(lock_key, token):
+    """Delete ``lock_key`` only while it still holds ``token``
+
+    A holder that overran CACHE_LOCK_TIMEOUT must not release the lease
+    another worker has taken since. On Redis the check and the delete are
+    one WATCH/MULTI transaction.
+    """
+    client = getattr(getattr(cache, 'client', None), 'get_client', None)
+    if client is None:
+        if cache.get(lock_key) == token:
+            cache.delete(lock_key)
+        return
+    key = cache.make_key(lock_key)
+    with client(write=True).pipeline() as pipe:
+        try:
+            pipe.watch(key)
+            # django_redis stores integers unpickled
+            if pipe.get(key) == str(token).encode():
+                pipe.multi()
+                pipe.delete(key)
+                pipe.execute()
+        except WatchError:
+            pass
+
+
+def get_or_build_entry(key, tag, build, timeout=None):
+    """Return the CacheEntry for ``key``, rebuilding it single-flight.
+
+    Only the worker that wins the ``lock:<key>`` lease runs ``build``. Others
+    serve the stale (or about-to-expire) entry they already have, or, when
+    there is none, wait for the winner's entry for as long as the lease is
+    held (at most CACHE_LOCK_TIMEOUT seconds). A lease released without an
+    entry means the winner's build raised, so they build themselves.
+    """
+    ttl = settings.CACHE_TTL if timeout is None else timeout
+    entry = cache.get(key)
+    if entry is not None and entry.tag == tag and not _refresh_due(entry):
+        return entry
+
+    lock_key = f'lock:{key}'
+    token = random.getrandbits(62)
+    if cache.add(lock_key, token, settings.CACHE_LOCK_TIMEOUT):
+        try:
+            return _rebuild_entry(key, tag, build, ttl)
+        finally:
+            _release_lease(lock_key, token)
+
+    if entry is not None:
+        return entry
+
+    deadline = time.monotonic() + settings.CACHE_LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry
+        # has_key goes to Redis, so a worker-local copy cannot hide a release
+        if not cache.has_key(lock_key):
+            break
+    # The lease holder failed (its build raised, e.g. Http404 for a missing
+    # row) or died without releasing; build without it
+    return _rebuild_entry(key, tag, build, ttl)
+
+
+def get_or_build_entries(tags, build_many, timeout=None):
+    """Return CacheEntries for many keys with one get_many and one set_many.
+
+    ``tags`` maps each cache key to the version tag its entry must carry.
+    ``build_many`` receives the keys that are missing or outdated and returns
+    ``{key: data}``; keys it leaves out (e.g. deleted rows) are absent from
+    the result.
+    """
+    ttl = settings.CACHE_TTL if timeout is None else timeout
+    entries = {key: entry for key, entry in cache.get_many(list(tags)).items() if entry.tag == tags[key]}
+    missing = [key for key in tags if key not in entries]
+    if missing:
+        started = time.monotonic()
+        built = build_many(missing)
+        delta = time.monotonic() - started
+        fresh = {key: encode_entry(data, tags[key], None, delta, time.time() + ttl) for key, data in built.items()}
+        if fresh:
+            cache.set_many(fresh, ttl + settings.CACHE_STALE_TTL)
+        entries.update(fresh)
+    return entries
+
+
+def cached_json_response(request, key, build, versions, timeout=None):
+    """Serve ``key`` from cache, building and storing it on a miss.
+
+    ``versions`` names the resources the response is built from. A matching
+    If-None-Match is answered with 304 before the cache is read, and cached
+    entries built from older versions are rebuilt. ``build`` returns
+    ``(data, headers)``; the headers are stored alongside the encoded body
+    and replayed on every hit.
+    """
+    tag, etag, last_modified = get_validators(request, *versions, compressible=True)
+    response = not_modified(request, etag, last_modified)
+    if response is not None:
+        return response
+    return entry_response(request, get_or_build_entry(key, tag, build, timeout))
+
+
+def invalidate_users(*user_ids):
+    """Evict the given users' cached reads and bump the versions behind them and the user list.
+
+    Runs when the current transaction commits (immediately outside one), so
+    a concurrent reader cannot cache rows from before the write under the
+    new versions.
+    """
+    def invalidate():
+        if user_ids:
+            cache.delete_many([f'user_{user_id}' for user_id in user_ids])
+        bump_version('users', *(f'user:{user_id}' for user_id in user_ids))
+    transaction.on_commit(invalidate)
+
+
+def invalidate_carts(cart_ids=(), user_ids=()):
+    """Bump the versions behind the cart list, the given carts and their users' cart lists.
+
+    Like invalidate_users, this is deferred until the current transaction commits.
+    """
+    names = (
+        'carts',
+        *(f'cart:{cart_id}' for cart_id in cart_ids),
+        *(f'user_carts:{user_id}' for user_id in user_ids),
+    )
+    transaction.on_commit(lambda: bump_version(*names))
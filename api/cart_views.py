@@ -1,100 +1,347 @@
-from django.http import JsonResponse, Http404
+from django.http import JsonResponse, HttpResponse, Http404
 from django.views import View
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
+from django.db import transaction, connection
+from django.utils import timezone
+from django.core.exceptions import ValidationError
 import json
-from django.db.models import Prefetch
+from django.db.models import Prefetch, Q, F, Sum, Count, DecimalField
+from django.contrib.postgres.aggregates import ArrayAgg
 
 from .models import Cart, CartItem, User, Product
+from .caching import conditional, cached_json_response, invalidate_carts
+from .streaming import wants_stream, stream_json_array
+from .bulk import parse_bulk_records, created, rejected, bulk_response
+from .pagination import PaginationError, parse_limit, parse_fields, encode_cursor, decode_cursor, set_next_link
+
+def parse_cart_date(value):
+    """Parse a cart date (ISO datetime or date string), returning an aware datetime or None"""
+    if not value:
+        return None
+    date = Cart._meta.get_field('date').to_python(value)
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date)
+    return date
+
+# Public ?fields= names -> the json_build_object arguments that produce
+# them. The FakeStore cart shape is built in Postgres, so no Cart/CartItem/
+# Product objects are hydrated. Dates are rendered by Postgres in ISO 8601
+# with the connection's UTC offset, matching datetime.isoformat().
+CART_JSON_FIELDS = {
+    'id': "'id', c.fakestore_id",
+    'userId': "'userId', u.fakestore_id",
+    'date': "'date', c.date",
+    'products': "'products', COALESCE(items.products, '[]'::json)",
+}
+
+# Only joined when the products field is requested
+CART_ITEMS_JOIN = """
+    LEFT JOIN LATERAL (
+        SELECT json_agg(json_build_object('productId', p.fakestore_id, 'quantity', ci.quantity) ORDER BY ci.id) AS products
+        FROM api_cartitem ci
+        JOIN api_product p ON p.id = ci.product_id
+        WHERE ci.cart_id = c.id
+    ) items ON true
+"""
+
+def cart_rows_sql(fields=None, where='TRUE', limit=None):
+    """SQL selecting each matching cart as JSON text (``cart``) with its ``fakestore_id``"""
+    fields = fields or tuple(CART_JSON_FIELDS)
+    sql = f"""
+        SELECT json_build_object({', '.join(CART_JSON_FIELDS[name] for name in fields)})::text AS cart, c.fakestore_id
+        FROM api_cart c
+        JOIN api_user u ON u.id = c.user_id
+        {CART_ITEMS_JOIN if 'products' in fields else ''}
+        WHERE {where}
+    """
+    if limit is not None:
+        sql += f' ORDER BY c.fakestore_id LIMIT {int(limit)}'
+    return sql
+
+def carts_json_agg_sql(fields=None, where='TRUE'):
+    return (
+        "SELECT COALESCE(json_agg(carts.cart::json ORDER BY carts.fakestore_id), '[]'::json)::text "
+        f"FROM ({cart_rows_sql(fields, where)}) carts"
+    )
+
+def carts_json(where='TRUE', params=(), fields=None):
+    """Return the JSON array of carts matching ``where``, aggregated by Postgres"""
+    with connection.cursor() as cursor:
+        cursor.execute(carts_json_agg_sql(fields, where), params)
+        return cursor.fetchone()[0]
+
+def carts_page_json(limit, after=None, fields=None):
+    """Return (JSON array, next fakestore_id or None) for one page of carts ordered by id"""
+    where, params = ('c.fakestore_id > %s', [after]) if after is not None else ('TRUE', [])
+    with connection.cursor() as cursor:
+        cursor.execute(cart_rows_sql(fields, where, limit + 1), params)
+        rows = cursor.fetchall()
+    next_id = rows[limit - 1][1] if len(rows) > limit else None
+    return '[' + ','.join(cart for cart, _ in rows[:limit]) + ']', next_id
+
+def user_carts_json(user_id):
+    """Return the JSON array of a user's carts, or None if the user does not exist
+
+    The user check and the aggregation run as a single query.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT ({carts_json_agg_sql(where='u.fakestore_id = %s')}) FROM api_user WHERE fakestore_id = %s",
+            [user_id, user_id],
+        )
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+def cart_stream_rows(fields=None):
+    """Cart rows with their lines aggregated into parallel arrays, for streaming"""
+    fields = fields or tuple(CART_JSON_FIELDS)
+    carts = Cart.objects.all()
+    columns = [column for name, column in (('id', 'fakestore_id'), ('userId', 'user__fakestore_id'), ('date', 'date')) if name in fields]
+    if 'products' in fields:
+        has_items = Q(items__isnull=False)
+        carts = carts.annotate(
+            product_ids=ArrayAgg('items__product__fakestore_id', filter=has_items, ordering='items__id'),
+            quantities=ArrayAgg('items__quantity', filter=has_items, ordering='items__id'),
+        )
+        columns += ['product_ids', 'quantities']
+    return carts.values(*columns).order_by('id')
+
+def format_cart_row(row):
+    cart = {}
+    if 'fakestore_id' in row:
+        cart['id'] = row['fakestore_id']
+    if 'user__fakestore_id' in row:
+        cart['userId'] = row['user__fakestore_id']
+    if 'date' in row:
+        cart['date'] = row['date'].isoformat()
+    if 'product_ids' in row:
+        cart['products'] = [
+            {'productId': product_id, 'quantity': quantity}
+            for product_id, quantity in zip(row['product_ids'] or [], row['quantities'] or [])
+        ]
+    return cart
+
+def cart_summaries(carts):
+    """Annotate carts with their line count, total quantity and total price in one query"""
+    line_price = F('items__quantity') * F('items__product__price')
+    return (
+        carts
+        .annotate(
+            item_count=Count('items'),
+            total_quantity=Sum('items__quantity', default=0),
+            total_price=Sum(line_price, output_field=DecimalField(max_digits=14, decimal_places=2), default=0),
+        )
+        .values('fakestore_id', 'user__fakestore_id', 'item_count', 'total_quantity', 'total_price')
+        .order_by('id')
+    )
+
+def format_cart_summary(row):
+    return {
+        'cartId': row['fakestore_id'],
+        'userId': row['user__fakestore_id'],
+        'itemCount': row['item_count'],
+        'totalQuantity': row['total_quantity'],
+        'totalPrice': float(row['total_price']),
+    }
+
+def parse_fakestore_id(value, name):
+    """Coerce a userId/productId (an int or a numeric string) to int, raising ValueError otherwise"""
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError(f'Invalid {name}: {value!r}')
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f'Invalid {name}: {value!r}')
+
+def merge_cart_lines(products):
+    """Map productId -> quantity for a list of cart lines, summing repeated products
+
+    Raises ValueError for a malformed line, productId or quantity (which
+    must be a positive integer).
+    """
+    lines = {}
+    for product_data in products:
+        if not isinstance(product_data, dict):
+            raise ValueError(f'Invalid cart line: {product_data!r}')
+        product_id = parse_fakestore_id(product_data.get('productId'), 'productId')
+        quantity = product_data.get('quantity', 1)
+        if isinstance(quantity, bool) or not isinstance(quantity, int) or quantity < 1:
+            raise ValueError(f'Invalid quantity for product {product_id}: {quantity!r}')
+        lines[product_id] = lines.get(product_id, 0) + quantity
+    return lines
 
 @method_decorator(csrf_exempt, name='dispatch')
 class DBCartListView(View):
+    @conditional('carts')
     def get(self, request):
-        """Get all carts from the database"""
-        carts = Cart.objects.select_related('user').prefetch_related(
-            Prefetch('items', queryset=CartItem.objects.select_related('product'))
-        ).all()
-        
-        result = []
-        for cart in carts:
-            cart_data = {
-                'id': cart.fakestore_id,
-                'userId': cart.user.fakestore_id,
-                'date': cart.date.isoformat() if cart.date else None,
-                'products': []
-            }
-            
-            # Add products in cart
-            for item in cart.items.all():
-                cart_data['products'].append({
-                    'productId': item.product.fakestore_id,
-                    'quantity': item.quantity
-                })
-                
-            result.append(cart_data)
-            
-        return JsonResponse(result, safe=False)
+        """Get all carts from the database, shaped into JSON by Postgres
+
+        Supports ?fields= projections and keyset pagination with ?limit= and
+        ?cursor=. With ``?stream=1`` the array is streamed from a server-side
+        cursor instead, keeping worker memory bounded for very large tables.
+        """
+        try:
+            fields = parse_fields(request.GET.get('fields'), CART_JSON_FIELDS)
+        except PaginationError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+        if wants_stream(request):
+            return stream_json_array(cart_stream_rows(fields), format_cart_row)
+        if 'limit' in request.GET or 'cursor' in request.GET:
+            return self.get_page(request, fields)
+        return HttpResponse(carts_json(fields=fields), content_type='application/json')
+
+    def get_page(self, request, fields):
+        """Serve one page of carts ordered by id (?limit=, ?cursor=)"""
+        try:
+            limit = parse_limit(request.GET.get('limit'))
+            cursor = request.GET.get('cursor') or None
+            after = decode_cursor(cursor, 'id', 1)[0] if cursor else None
+        except PaginationError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+        body, next_id = carts_page_json(limit, after, fields)
+        response = HttpResponse(body, content_type='application/json')
+        if next_id is not None:
+            response['X-Next-Cursor'] = encode_cursor('id', [next_id])
+        return set_next_link(request, response)
     
     def post(self, request):
-        """Create a new cart in the database"""
+        """Create a new cart in the database
+
+        All productIds are validated with one in_bulk query and the items are
+        inserted with one bulk_create, in the same transaction as the cart,
+        so a bad productId never leaves a half-built cart behind.
+        """
         try:
             data = json.loads(request.body)
             
-            # Find the highest fakestore_id and add 1
-            max_id = Cart.objects.all().order_by('-fakestore_id').first()
-            new_id = (max_id.fakestore_id + 1) if max_id else 1
-            
             # Get user or return error
             try:
-                user = User.objects.get(fakestore_id=data.get('userId'))
+                user = User.objects.only('id', 'fakestore_id').get(fakestore_id=data.get('userId'))
             except User.DoesNotExist:
                 return JsonResponse({'error': f"User with ID {data.get('userId')} not found"}, status=400)
+
+            lines = merge_cart_lines(data.get('products', []))
+            products = Product.objects.only('id', 'fakestore_id').in_bulk(list(lines), field_name='fakestore_id')
+            for product_id in lines:
+                if product_id not in products:
+                    return JsonResponse({'error': f"Product with ID {product_id} not found"}, status=400)
+
+            with transaction.atomic():
+                # Create cart; fakestore_id comes from the column's sequence default
+                cart = Cart.objects.create(
+                    user=user,
+                    date=parse_cart_date(data.get('date')) or timezone.now()
+                )
+                CartItem.objects.bulk_create([
+                    CartItem(cart=cart, product=products[product_id], quantity=quantity)
+                    for product_id, quantity in lines.items()
+                ])
+
+            invalidate_carts([cart.fakestore_id], [user.fakestore_id])
             
-            # Create cart
-            cart = Cart.objects.create(
-                fakestore_id=new_id,
-                user=user,
-                date=data.get('date')
-            )
-            
-            # Add products
-            for product_data in data.get('products', []):
-                try:
-                    product = Product.objects.get(fakestore_id=product_data.get('productId'))
-                    CartItem.objects.create(
-                        cart=cart,
-                        product=product,
-                        quantity=product_data.get('quantity', 1)
-                    )
-                except Product.DoesNotExist:
-                    return JsonResponse({'error': f"Product with ID {product_data.get('productId')} not found"}, status=400)
-            
-            # Format response
+            # Format response from the data already in memory
             response_data = {
                 'id': cart.fakestore_id,
-                'userId': cart.user.fakestore_id,
-                'date': cart.date.isoformat() if cart.date else None,
-                'products': []
+                'userId': user.fakestore_id,
+                'date': cart.date.isoformat(),
+                'products': [
+                    {'productId': product_id, 'quantity': quantity}
+                    for product_id, quantity in lines.items()
+                ]
             }
             
-            # Add products to response
-            for item in cart.items.all():
-                response_data['products'].append({
-                    'productId': item.product.fakestore_id,
-                    'quantity': item.quantity
-                })
-            
             return JsonResponse(response_data, status=201)
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=400)
 
+@method_decorator(csrf_exempt, name='dispatch')
+class DBCartBulkView(View):
+    def post(self, request):
+        """Create many carts, with their items, in one transaction
+
+        userIds and productIds across the whole batch are resolved with one
+        query each. Carts and then their items are inserted with one
+        bulk_create each; carts that reference unknown users or products are
+        reported without blocking the rest.
+        """
+        try:
+            records = parse_bulk_records(request)
+        except Exception as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+        # A malformed line or date rejects only its own record
+        results = [None] * len(records)
+        user_ids = [None] * len(records)
+        lines = [{}] * len(records)
+        dates = [None] * len(records)
+        for index, record in enumerate(records):
+            try:
+                user_ids[index] = parse_fakestore_id(record.get('userId'), 'userId')
+                lines[index] = merge_cart_lines(record.get('products') or [])
+                dates[index] = parse_cart_date(record.get('date')) or timezone.now()
+            except ValidationError as e:
+                results[index] = rejected('; '.join(e.messages))
+            except Exception as e:
+                results[index] = rejected(str(e))
+
+        users = User.objects.only('id', 'fakestore_id').in_bulk(
+            {user_id for user_id in user_ids if user_id is not None}, field_name='fakestore_id'
+        )
+        products = Product.objects.only('id', 'fakestore_id').in_bulk(
+            {product_id for cart_lines in lines for product_id in cart_lines}, field_name='fakestore_id'
+        )
+        pending = []
+        for index, record in enumerate(records):
+            if results[index] is not None:
+                continue
+            user = users.get(user_ids[index])
+            unknown = [product_id for product_id in lines[index] if product_id not in products]
+            if user is None:
+                results[index] = rejected(f"User with ID {user_ids[index]} not found")
+            elif unknown:
+                results[index] = rejected(f"Product with ID {unknown[0]} not found")
+            else:
+                pending.append((index, Cart(user=user, date=dates[index])))
+
+        try:
+            with transaction.atomic():
+                # fakestore_ids come from the column's sequence default
+                Cart.objects.bulk_create([cart for _, cart in pending])
+                CartItem.objects.bulk_create([
+                    CartItem(cart=cart, product=products[product_id], quantity=quantity)
+                    for index, cart in pending
+                    for product_id, quantity in lines[index].items()
+                ])
+                invalidate_carts(
+                    [cart.fakestore_id for _, cart in pending],
+                    {cart.user.fakestore_id for _, cart in pending},
+                )
+        except Exception as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+        for index, cart in pending:
+            results[index] = created({
+                'id': cart.fakestore_id,
+                'userId': cart.user.fakestore_id,
+                'date': cart.date.isoformat(),
+                'products': [
+                    {'productId': product_id, 'quantity': quantity}
+                    for product_id, quantity in lines[index].items()
+                ]
+            })
+        return bulk_response(results)
+
 @method_decorator(csrf_exempt, name='dispatch')
 class DBCartDetailView(View):
+    @conditional('cart:{pk}')
     def get(self, request, pk):
         """Get a cart by ID from the database"""
         try:
             cart = Cart.objects.select_related('user').prefetch_related(
-                Prefetch('items', queryset=CartItem.objects.select_related('product'))
+                Prefetch('items', queryset=CartItem.objects.select_related('product').order_by('id'))
             ).get(fakestore_id=pk)
             
             # Format response
@@ -117,55 +364,75 @@ class DBCartDetailView(View):
             raise Http404('Cart not found')
             
     def put(self, request, pk):
-        """Update a cart completely"""
+        """Update a cart completely
+
+        The new product list is diffed against the stored items and applied
+        with one DELETE, one bulk_update and one bulk_create in a single
+        transaction, so readers never see a half-replaced cart and a bad
+        productId leaves the cart untouched.
+        """
         try:
-            cart = Cart.objects.get(fakestore_id=pk)
             data = json.loads(request.body)
+            lines = merge_cart_lines(data.get('products', []) or []) if 'products' in data else None
+
+            with transaction.atomic():
+                cart = Cart.objects.select_for_update(of=('self',)).select_related('user').get(fakestore_id=pk)
+                previous_user_id = cart.user.fakestore_id
             
-            # Update cart fields if provided
-            if 'userId' in data:
-                try:
-                    cart.user = User.objects.get(fakestore_id=data.get('userId'))
-                except User.DoesNotExist:
-                    return JsonResponse({'error': f"User with ID {data.get('userId')} not found"}, status=400)
-                
-            if 'date' in data:
-                cart.date = data.get('date')
+                # Update cart fields if provided
+                if 'userId' in data:
+                    try:
+                        cart.user = User.objects.only('id', 'fakestore_id').get(fakestore_id=data.get('userId'))
+                    except User.DoesNotExist:
+                        return JsonResponse({'error': f"User with ID {data.get('userId')} not found"}, status=400)
                 
-            cart.save()
-            
-            # Update products if provided
-            if 'products' in data:
-                # Delete existing items
-                cart.items.all().delete()
+                if 'date' in data:
+                    cart.date = parse_cart_date(data.get('date')) or cart.date
+
+                # Update products if provided
+                if lines is not None:
+                    products = Product.objects.only('id', 'fakestore_id').in_bulk(list(lines), field_name='fakestore_id')
+                    for product_id in lines:
+                        if product_id not in products:
+                            return JsonResponse({'error': f"Product with ID {product_id} not found"}, status=400)
+
+                    desired = {products[product_id].pk: quantity for product_id, quantity in lines.items()}
+                    existing = {
+                        product_pk: (item_pk, quantity)
+                        for item_pk, product_pk, quantity in cart.items.values_list('id', 'product_id', 'quantity')
+                    }
+                    CartItem.objects.filter(
+                        pk__in=[item_pk for product_pk, (item_pk, _) in existing.items() if product_pk not in desired]
+                    ).delete()
+                    CartItem.objects.bulk_update([
+                        CartItem(pk=existing[product_pk][0], quantity=quantity)
+                        for product_pk, quantity in desired.items()
+                        if product_pk in existing and existing[product_pk][1] != quantity
+                    ], ['quantity'])
+                    CartItem.objects.bulk_create([
+                        CartItem(cart=cart, product_id=product_pk, quantity=quantity)
+                        for product_pk, quantity in desired.items()
+                        if product_pk not in existing
+                    ])
+
+                # Lines in stored order, as every read of the cart returns them
+                items = list(cart.items.order_by('id').values_list('product__fakestore_id', 'quantity'))
                 
-                # Add new items
-                for product_data in data.get('products', []):
-                    try:
-                        product = Product.objects.get(fakestore_id=product_data.get('productId'))
-                        CartItem.objects.create(
-                            cart=cart,
-                            product=product,
-                            quantity=product_data.get('quantity', 1)
-                        )
-                    except Product.DoesNotExist:
-                        return JsonResponse({'error': f"Product with ID {product_data.get('productId')} not found"}, status=400)
+                cart.save(update_fields=['user', 'date'])
+
+            invalidate_carts([pk], {previous_user_id, cart.user.fakestore_id})
             
             # Format response
             response_data = {
                 'id': cart.fakestore_id,
                 'userId': cart.user.fakestore_id,
                 'date': cart.date.isoformat() if cart.date else None,
-                'products': []
+                'products': [
+                    {'productId': product_id, 'quantity': quantity}
+                    for product_id, quantity in items
+                ]
             }
             
-            # Add products to response
-            for item in cart.items.all():
-                response_data['products'].append({
-                    'productId': item.product.fakestore_id,
-                    'quantity': item.quantity
-                })
-            
             return JsonResponse(response_data)
         except Cart.DoesNotExist:
             raise Http404('Cart not found')
@@ -173,22 +440,18 @@ class DBCartDetailView(View):
             return JsonResponse({'error': str(e)}, status=400)
     
     def patch(self, request, pk):
-        """Partially update a cart (add/update/remove products, change user/date)"""
+        """Partially update a cart (add/update/remove products, change user/date)
+
+        The cart row is locked with SELECT ... FOR UPDATE and the whole diff
+        is validated before anything is written, then applied in one
+        transaction: one product query, one INSERT ... ON CONFLICT for adds,
+        one upsert for updates and one DELETE for removals, which only
+        apply to lines the cart held before the request. Concurrent
+        PATCHes therefore serialize instead of losing increments.
+        """
         try:
-            cart = Cart.objects.get(fakestore_id=pk)
             data = json.loads(request.body)
 
-            # Change user if provided
-            if 'userId' in data:
-                try:
-                    cart.user = User.objects.get(fakestore_id=data.get('userId'))
-                except User.DoesNotExist:
-                    return JsonResponse({'error': f"User with ID {data.get('userId')} not found"}, status=400)
-
-            # Change date if provided
-            if 'date' in data:
-                cart.date = data.get('date')
-
             # Operations on products
             # Expected structure (any subset):
             # {
@@ -197,27 +460,8 @@ class DBCartDetailView(View):
             #   "remove": [3,4]
             # }
             # If a product is added that already exists, quantity is incremented unless also in update.
-
-            # Helper: build lookup of existing items
-            existing_items = {ci.product.fakestore_id: ci for ci in cart.items.select_related('product').all()}
-
-            # Handle add
-            for prod in data.get('add', []) or []:
-                pid = prod.get('productId')
-                qty = prod.get('quantity', 1)
-                if pid is None:
-                    continue
-                try:
-                    product = Product.objects.get(fakestore_id=pid)
-                except Product.DoesNotExist:
-                    return JsonResponse({'error': f"Product with ID {pid} not found"}, status=400)
-                if pid in existing_items:
-                    existing_items[pid].quantity += qty
-                    existing_items[pid].save()
-                else:
-                    CartItem.objects.create(cart=cart, product=product, quantity=qty)
-
-            # Handle update (set quantity)
+            adds = merge_cart_lines(prod for prod in data.get('add', []) or [] if prod.get('productId') is not None)
+            updates = {}
             for prod in data.get('update', []) or []:
                 pid = prod.get('productId')
                 if pid is None:
@@ -225,37 +469,68 @@ class DBCartDetailView(View):
                 qty = prod.get('quantity')
                 if qty is None or qty < 0:
                     return JsonResponse({'error': f"Invalid quantity for product {pid}"}, status=400)
-                # Create if not exists (upsert semantics)
-                try:
-                    product = Product.objects.get(fakestore_id=pid)
-                except Product.DoesNotExist:
-                    return JsonResponse({'error': f"Product with ID {pid} not found"}, status=400)
-                item = existing_items.get(pid)
-                if item:
-                    item.quantity = qty
-                    item.save()
-                else:
-                    CartItem.objects.create(cart=cart, product=product, quantity=qty)
-
-            # Handle remove
-            for pid in data.get('remove', []) or []:
-                if pid in existing_items:
-                    existing_items[pid].delete()
-
-            cart.save()
+                updates[pid] = qty
+            removes = set(data.get('remove', []) or [])
+            # Updates set the final quantity, so they win over adds
+            adds = {pid: qty for pid, qty in adds.items() if pid not in updates}
+
+            with transaction.atomic():
+                cart = Cart.objects.select_for_update(of=('self',)).select_related('user').get(fakestore_id=pk)
+                previous_user_id = cart.user.fakestore_id
+
+                # Change user if provided
+                if 'userId' in data:
+                    try:
+                        cart.user = User.objects.only('id', 'fakestore_id').get(fakestore_id=data.get('userId'))
+                    except User.DoesNotExist:
+                        return JsonResponse({'error': f"User with ID {data.get('userId')} not found"}, status=400)
+
+                # Change date if provided
+                if 'date' in data:
+                    cart.date = parse_cart_date(data.get('date')) or cart.date
+
+                # Resolve every referenced product with one query
+                wanted = list({*adds, *updates})
+                products = Product.objects.only('id', 'fakestore_id').in_bulk(wanted, field_name='fakestore_id')
+                for pid in wanted:
+                    if pid not in products:
+                        return JsonResponse({'error': f"Product with ID {pid} not found"}, status=400)
+
+                if 'userId' in data or 'date' in data:
+                    cart.save(update_fields=['user', 'date'])
+
+                # Removals only apply to lines the cart held before this
+                # request, so a line the same request creates is kept
+                removed_items = (
+                    list(cart.items.filter(product__fakestore_id__in=removes).values_list('id', flat=True))
+                    if removes else []
+                )
+
+                CartItem.add_quantities(cart, {products[pid].pk: qty for pid, qty in adds.items()})
+                if updates:
+                    CartItem.objects.bulk_create(
+                        [CartItem(cart=cart, product=products[pid], quantity=qty) for pid, qty in updates.items()],
+                        update_conflicts=True,
+                        unique_fields=['cart', 'product'],
+                        update_fields=['quantity'],
+                    )
+                if removed_items:
+                    CartItem.objects.filter(pk__in=removed_items).delete()
+
+                items = list(cart.items.order_by('id').values_list('product__fakestore_id', 'quantity'))
+
+            invalidate_carts([pk], {previous_user_id, cart.user.fakestore_id})
 
             # Response
             response_data = {
                 'id': cart.fakestore_id,
                 'userId': cart.user.fakestore_id,
                 'date': cart.date.isoformat() if cart.date else None,
-                'products': []
+                'products': [
+                    {'productId': product_id, 'quantity': quantity}
+                    for product_id, quantity in items
+                ]
             }
-            for item in cart.items.select_related('product').all():
-                response_data['products'].append({
-                    'productId': item.product.fakestore_id,
-                    'quantity': item.quantity
-                })
             return JsonResponse(response_data)
         except Cart.DoesNotExist:
             raise Http404('Cart not found')
@@ -275,6 +550,7 @@ class DBCartDetailView(View):
             
             # Delete cart (this will cascade delete items as well)
             cart.delete()
+            invalidate_carts([pk], [response_data['userId']])
             
             return JsonResponse(response_data)
         except Cart.DoesNotExist:
@@ -283,32 +559,51 @@ class DBCartDetailView(View):
 @method_decorator(csrf_exempt, name='dispatch')
 class DBUserCartListView(View):
     def get(self, request, user_id):
-        """Get carts for a specific user from the database"""
-        try:
-            user = User.objects.get(fakestore_id=user_id)
-            
-            carts = Cart.objects.filter(user=user).prefetch_related(
-                Prefetch('items', queryset=CartItem.objects.select_related('product'))
-            )
-            
-            result = []
-            for cart in carts:
-                cart_data = {
-                    'id': cart.fakestore_id,
-                    'userId': cart.user.fakestore_id,
-                    'date': cart.date.isoformat() if cart.date else None,
-                    'products': []
-                }
-                
-                # Add products in cart
-                for item in cart.items.all():
-                    cart_data['products'].append({
-                        'productId': item.product.fakestore_id,
-                        'quantity': item.quantity
-                    })
-                    
-                result.append(cart_data)
-                
-            return JsonResponse(result, safe=False)
-        except User.DoesNotExist:
-            raise Http404('User not found')
+        """Get carts for a specific user from the database, shaped into JSON by Postgres
+
+        Cached per user until one of the user's carts is written or the user
+        is deleted.
+        """
+        def build():
+            carts = user_carts_json(user_id)
+            if carts is None:
+                raise Http404('User not found')
+            return carts.encode('utf-8'), None
+
+        return cached_json_response(request, f'user_carts_{user_id}', build, versions=(f'user_carts:{user_id}',))
+
+@method_decorator(csrf_exempt, name='dispatch')
+class DBCartSummaryView(View):
+    def get(self, request, pk):
+        """Get the item count, total quantity and total price of a cart
+
+        Cached until the cart changes or any product price does.
+        """
+        def build():
+            summary = cart_summaries(Cart.objects.filter(fakestore_id=pk)).first()
+            if summary is None:
+                raise Http404('Cart not found')
+            return format_cart_summary(summary), None
+
+        return cached_json_response(request, f'cart_summary_{pk}', build, versions=(f'cart:{pk}', 'prices'))
+
+@method_decorator(csrf_exempt, name='dispatch')
+class DBUserCartSummaryView(View):
+    def get(self, request, user_id):
+        """Get per-cart and overall totals for a user's carts"""
+        def build():
+            carts = [format_cart_summary(row) for row in cart_summaries(Cart.objects.filter(user__fakestore_id=user_id))]
+            if not carts and not User.objects.filter(fakestore_id=user_id).exists():
+                raise Http404('User not found')
+            return {
+                'userId': user_id,
+                'cartCount': len(carts),
+                'itemCount': sum(cart['itemCount'] for cart in carts),
+                'totalQuantity': sum(cart['totalQuantity'] for cart in carts),
+                'totalPrice': round(sum((cart['totalPrice'] for cart in carts), 0.0), 2),
+                'carts': carts,
+            }, None
+
+        return cached_json_response(
+            request, f'user_cart_summary_{user_id}', build, versions=(f'user_carts:{user_id}', 'prices')
+        )
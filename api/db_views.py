@@ -1,44 +1,184 @@
-from django.http import JsonResponse, Http404
+from django.http import JsonResponse, HttpResponse, Http404
 from django.views import View
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
-from django.db.models import Prefetch
-from django.conf import settings
-from django.core.cache import cache
+from django.db.models import Prefetch, F
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramSimilarity
 from django.views.decorators.cache import cache_page
+from django.core.exceptions import ValidationError
+from django.db import transaction
+import hashlib
 import json
 
-from .models import Product, User, UserAddress, Cart, CartItem
+from .models import Product, User, UserAddress, Cart, CartItem, sync_fakestore_id_sequence
+from .caching import (
+    cached_json_response, get_versions, get_or_build_entries, entry_body, not_modified, set_validators,
+)
+from .pagination import (
+    PRODUCT_SORT_FIELDS, MAX_PAGE_LIMIT, PaginationError, parse_limit, parse_offset, parse_sort,
+    encode_cursor, decode_cursor, keyset_page, parse_fields, select_columns, pick_fields, fields_key,
+    set_next_link,
+)
+
+PRODUCT_VALUE_FIELDS = (
+    'fakestore_id', 'title', 'price', 'description', 'category', 'image', 'rating_rate', 'rating_count'
+)
+
+# Public ?fields= names -> the columns each one is built from
+PRODUCT_FIELD_COLUMNS = {
+    'id': ('fakestore_id',),
+    'title': ('title',),
+    'price': ('price',),
+    'description': ('description',),
+    'category': ('category',),
+    'image': ('image',),
+    'rating': ('rating_rate', 'rating_count'),
+}
+
+def format_product_row(product):
+    """Reshape a ``values()`` row into the FakeStore API product structure
+
+    Rows read for a ``?fields=`` projection may lack some columns; only the
+    fields present are reshaped.
+    """
+    if 'fakestore_id' in product:
+        product['id'] = product.pop('fakestore_id')
+    if 'price' in product:
+        product['price'] = float(product['price'])
+    if 'rating_rate' in product:
+        product['rating'] = {
+            'rate': float(product['rating_rate']) if product['rating_rate'] else None,
+            'count': product['rating_count']
+        }
+        del product['rating_rate']
+        del product['rating_count']
+    return product
+
+MAX_BULK_PRODUCTS = 1000
+
+def format_product(product):
+    """Format a Product instance in the FakeStore API product structure"""
+    return {
+        'id': product.fakestore_id,
+        'title': product.title,
+        'price': float(product.price),
+        'description': product.description,
+        'category': product.category,
+        'image': product.image,
+        'rating': {
+            'rate': float(product.rating_rate) if product.rating_rate else None,
+            'count': product.rating_count
+        }
+    }
+
+def parse_id_list(value, maximum=MAX_PAGE_LIMIT):
+    """Parse a comma-separated ``?ids=`` value into unique ints, keeping order"""
+    try:
+        ids = list(dict.fromkeys(int(part) for part in value.split(',') if part.strip()))
+    except ValueError:
+        raise ValueError('ids must be a comma-separated list of integers')
+    if not ids:
+        raise ValueError('ids must not be empty')
+    if len(ids) > maximum:
+        raise ValueError(f'At most {maximum} ids can be requested at once')
+    return ids
+
+def product_page_response(request, queryset, cache_prefix, versions):
+    """Serve one keyset-paginated page of ``queryset`` (?limit=, ?cursor=, ?sort=, ?fields=)
+
+    The next page's cursor is returned in the X-Next-Cursor and Link headers
+    so the body keeps the FakeStore array shape. Each page is cached on its
+    own; bumping any of ``versions`` retires every page at once.
+    """
+    try:
+        limit = parse_limit(request.GET.get('limit'))
+        sort, field, descending = parse_sort(request.GET.get('sort'), PRODUCT_SORT_FIELDS)
+        cursor = request.GET.get('cursor') or None
+        after = decode_cursor(cursor, sort, 1 if field == 'fakestore_id' else 2) if cursor else None
+        fields = parse_fields(request.GET.get('fields'), PRODUCT_FIELD_COLUMNS)
+    except PaginationError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    def build():
+        # The sort key is read even when not projected; the cursor needs it
+        columns = select_columns(PRODUCT_FIELD_COLUMNS, fields, 'fakestore_id', field)
+        rows = list(keyset_page(queryset.values(*columns), field, descending, limit, after))
+        headers = {}
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            values = [last['fakestore_id']] if field == 'fakestore_id' else [last[field], last['fakestore_id']]
+            headers['X-Next-Cursor'] = encode_cursor(sort, values)
+        return [pick_fields(format_product_row(row), fields) for row in rows], headers
+
+    cache_key = f"{cache_prefix}:{sort}:{limit}:{cursor or ''}{fields_key(fields)}"
+    try:
+        response = cached_json_response(request, cache_key, build, versions=versions)
+    except ValidationError:
+        # A sort value (e.g. a price) that does not fit its column
+        return JsonResponse({'error': 'Invalid cursor'}, status=400)
+    return set_next_link(request, response)
 
 @method_decorator(csrf_exempt, name='dispatch')
 class DBProductListView(View):
     def get(self, request):
         """Get all products from the database with Redis caching"""
-        # Try to get products from cache
-        products = cache.get('product_list')
-        
-        if not products:
-            # If not in cache, fetch from database
-            self.request = request
-            products = list(Product.objects.all().values(
-                'fakestore_id', 'title', 'price', 'description', 'category', 'image', 'rating_rate', 'rating_count'
-            ))
-            
-            # Format response to match FakeStore API structure
-            for product in products:
-                product['id'] = product.pop('fakestore_id')
-                product['price'] = float(product['price'])
-                product['rating'] = {
-                    'rate': float(product['rating_rate']) if product['rating_rate'] else None,
-                    'count': product['rating_count']
-                }
-                del product['rating_rate']
-                del product['rating_count']
-            
-            # Store in cache for CACHE_TTL seconds
-            cache.set('product_list', products, settings.CACHE_TTL)
-            
-        return JsonResponse(products, safe=False)
+        if 'ids' in request.GET:
+            return self.get_batch(request)
+        if 'limit' in request.GET or 'cursor' in request.GET:
+            return product_page_response(request, Product.objects.all(), 'product_page', ('products',))
+
+        try:
+            sort, field, descending = parse_sort(request.GET.get('sort'), PRODUCT_SORT_FIELDS)
+            fields = parse_fields(request.GET.get('fields'), PRODUCT_FIELD_COLUMNS)
+        except PaginationError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+        def build():
+            prefix = '-' if descending else ''
+            rows = Product.objects.order_by(f'{prefix}{field}', f'{prefix}fakestore_id').values(
+                *select_columns(PRODUCT_FIELD_COLUMNS, fields)
+            )
+            return [pick_fields(format_product_row(row), fields) for row in rows], None
+
+        # The cached entry is the finished JSON body, so a hit is one Redis GET
+        cache_key = ('product_list' if sort == 'id' else f'product_list:{sort}') + fields_key(fields)
+        return cached_json_response(request, cache_key, build, versions=('products',))
+
+    def get_batch(self, request):
+        """Get several products by ID (?ids=1,5,9) in one round trip
+
+        All ids are resolved with one cache.get_many on the per-product keys
+        shared with DBProductDetailView; misses are filled with a single
+        fakestore_id__in query and written back with set_many. Unknown ids
+        are left out of the response.
+        """
+        try:
+            ids = parse_id_list(request.GET['ids'])
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+        versions = get_versions(*(f'product:{pid}' for pid in ids))
+        tags = {f'product_{pid}': str(version) for pid, version in zip(ids, versions)}
+
+        # The ids (in response order) are hashed too: two batches whose
+        # products share version stamps are still different bodies
+        material = ','.join(map(str, ids)) + ':' + '.'.join(tags.values())
+        etag = '"%s"' % hashlib.sha1(material.encode()).hexdigest()
+        last_modified = max(versions) // 10 ** 9
+        response = not_modified(request, etag, last_modified)
+        if response is not None:
+            return response
+
+        def build_many(keys):
+            wanted = [int(key.removeprefix('product_')) for key in keys]
+            rows = Product.objects.filter(fakestore_id__in=wanted).values(*PRODUCT_VALUE_FIELDS)
+            return {f"product_{row['fakestore_id']}": format_product_row(row) for row in rows}
+
+        entries = get_or_build_entries(tags, build_many)
+        # Entries hold finished JSON, so the array is assembled without re-encoding
+        body = b'[' + b','.join(entry_body(entries[key]) for key in tags if key in entries) + b']'
+        return set_validators(HttpResponse(body, content_type='application/json'), etag, last_modified)
     
     def post(self, request):
         """Create a new product in the database"""
@@ -46,12 +186,9 @@ class DBProductListView(View):
             data = json.loads(request.body)
             rating = data.pop('rating', {})
             
-            # Find the highest fakestore_id and add 1
-            max_id = Product.objects.all().order_by('-fakestore_id').first()
-            new_id = (max_id.fakestore_id + 1) if max_id else 1
-            
+            # fakestore_id comes from the column's sequence default and is
+            # returned by the INSERT
             product = Product.objects.create(
-                fakestore_id=new_id,
                 title=data.get('title', ''),
                 price=data.get('price', 0),
                 description=data.get('description', ''),
@@ -81,39 +218,102 @@ class DBProductListView(View):
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=400)
 
+@method_decorator(csrf_exempt, name='dispatch')
+class DBProductBulkView(View):
+    """Create, replace or update many products in one request
+
+    Every item is written by a single INSERT ... ON CONFLICT (fakestore_id)
+    DO UPDATE in one transaction, and the caches are invalidated once for
+    the whole batch rather than once per product.
+    """
+
+    def parse_items(self, request, require_ids):
+        items = json.loads(request.body)
+        if not isinstance(items, list) or not items:
+            raise ValueError('Expected a non-empty array of products')
+        if len(items) > MAX_BULK_PRODUCTS:
+            raise ValueError(f'At most {MAX_BULK_PRODUCTS} products can be written at once')
+        if not all(isinstance(item, dict) for item in items):
+            raise ValueError('Every product must be an object')
+        ids = [item['id'] for item in items if item.get('id') is not None]
+        if require_ids and len(ids) != len(items):
+            raise ValueError('Every product must have an id')
+        if len(set(ids)) != len(ids):
+            raise ValueError('Product ids must be unique within a batch')
+        return items, ids
+
+    def post(self, request):
+        """Create products; items with an id replace that product or create it with that id"""
+        try:
+            items, ids = self.parse_items(request, require_ids=False)
+            with transaction.atomic():
+                existing = Product.objects.only('fakestore_id', 'category', 'price').in_bulk(ids, field_name='fakestore_id')
+                products = []
+                for item in items:
+                    rating = item.get('rating') or {}
+                    product = Product(
+                        title=item.get('title', ''),
+                        price=item.get('price', 0),
+                        description=item.get('description', ''),
+                        category=item.get('category', ''),
+                        image=item.get('image', ''),
+                        rating_rate=rating.get('rate'),
+                        rating_count=rating.get('count')
+                    )
+                    if item.get('id') is not None:
+                        # Without an id the sequence default allocates one
+                        product.fakestore_id = item['id']
+                        previous = existing.get(item['id'])
+                        if previous is not None:
+                            product._loaded_category = previous.category
+                            product._loaded_price = previous.price
+                    products.append(product)
+                Product.upsert_many(products)
+                if len(existing) < len(ids):
+                    # New rows were inserted with explicit ids
+                    sync_fakestore_id_sequence(Product)
+            return JsonResponse([format_product(product) for product in products], safe=False, status=201)
+        except Exception as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+    def patch(self, request):
+        """Partially update existing products, each identified by its id"""
+        try:
+            items, ids = self.parse_items(request, require_ids=True)
+            with transaction.atomic():
+                existing = Product.objects.select_for_update().in_bulk(ids, field_name='fakestore_id')
+                missing = [pid for pid in ids if pid not in existing]
+                if missing:
+                    return JsonResponse({'error': f'Products not found: {missing}'}, status=404)
+                products = []
+                for item in items:
+                    product = existing[item['id']]
+                    for field in ('title', 'price', 'description', 'category', 'image'):
+                        if field in item:
+                            setattr(product, field, item[field])
+                    rating = item.get('rating') or {}
+                    if 'rate' in rating:
+                        product.rating_rate = rating['rate']
+                    if 'count' in rating:
+                        product.rating_count = rating['count']
+                    products.append(product)
+                Product.upsert_many(products)
+            return JsonResponse([format_product(product) for product in products], safe=False)
+        except Exception as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
 @method_decorator(csrf_exempt, name='dispatch')
 class DBProductDetailView(View):
     def get(self, request, pk):
         """Get a product by ID from the database with Redis caching"""
-        # Try to get product from cache
-        cache_key = f'product_{pk}'
-        response_data = cache.get(cache_key)
-        
-        if not response_data:
+        def build():
             try:
-                product = Product.objects.get(fakestore_id=pk)
-                
-                # Format response
-                response_data = {
-                    'id': product.fakestore_id,
-                    'title': product.title,
-                    'price': float(product.price),
-                    'description': product.description,
-                    'category': product.category,
-                    'image': product.image,
-                    'rating': {
-                        'rate': float(product.rating_rate) if product.rating_rate else None,
-                        'count': product.rating_count
-                    }
-                }
-                
-                # Store in cache
-                cache.set(cache_key, response_data, settings.CACHE_TTL)
-                
+                product = Product.objects.values(*PRODUCT_VALUE_FIELDS).get(fakestore_id=pk)
             except Product.DoesNotExist:
                 raise Http404('Product not found')
-                
-        return JsonResponse(response_data)
+            return format_product_row(product), None
+
+        return cached_json_response(request, f'product_{pk}', build, versions=(f'product:{pk}',))
     
     def put(self, request, pk):
         """Update a product completely"""
@@ -216,3 +416,88 @@ class DBProductDetailView(View):
             return JsonResponse(product_data)
         except Product.DoesNotExist:
             raise Http404('Product not found')
+
+class DBProductCategoryListView(View):
+    def get(self, request):
+        """Get all distinct product categories"""
+        def build():
+            categories = Product.objects.order_by('category').values_list('category', flat=True).distinct()
+            return list(categories), None
+
+        return cached_json_response(request, 'product_categories', build, versions=('categories',))
+
+class DBCategoryProductListView(View):
+    def get(self, request, name):
+        """Get the products in one category, with optional ?sort=, ?limit=, ?cursor= and ?fields="""
+        queryset = Product.objects.filter(category=name)
+        versions = (f'category:{name}',)
+        if 'limit' in request.GET or 'cursor' in request.GET:
+            return product_page_response(request, queryset, f'category_page:{name}', versions)
+
+        try:
+            sort, field, descending = parse_sort(request.GET.get('sort'), PRODUCT_SORT_FIELDS)
+            fields = parse_fields(request.GET.get('fields'), PRODUCT_FIELD_COLUMNS)
+        except PaginationError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+        def build():
+            prefix = '-' if descending else ''
+            rows = queryset.order_by(f'{prefix}{field}', f'{prefix}fakestore_id').values(
+                *select_columns(PRODUCT_FIELD_COLUMNS, fields)
+            )
+            return [pick_fields(format_product_row(row), fields) for row in rows], None
+
+        cache_key = f'category_products:{name}:{sort}{fields_key(fields)}'
+        return cached_json_response(request, cache_key, build, versions=versions)
+
+class DBProductSearchView(View):
+    def get(self, request):
+        """Search products by title and description (?q=, ?limit=, ?offset=)
+
+        Matches come from the stored search_vector column, ranked with
+        ts_rank. When nothing matches and ?fuzzy=0 is not given, titles are
+        matched by trigram similarity instead so typos still find products.
+        The X-Search-Mode header says which of the two produced the results.
+        """
+        q = request.GET.get('q', '').strip()
+        if not q:
+            return JsonResponse({'error': 'q is required'}, status=400)
+        try:
+            limit = parse_limit(request.GET.get('limit'))
+            offset = parse_offset(request.GET.get('offset'))
+        except PaginationError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        fuzzy = request.GET.get('fuzzy', '1') != '0'
+
+        def build():
+            query = SearchQuery(q, search_type='websearch', config='english')
+            matches = Product.objects.filter(search_vector=query)
+            rows = list(
+                matches.annotate(rank=SearchRank(F('search_vector'), query))
+                .order_by('-rank', 'fakestore_id')
+                .values(*PRODUCT_VALUE_FIELDS)[offset:offset + limit + 1]
+            )
+            mode = 'fulltext'
+            if not rows and fuzzy and (offset == 0 or not matches.exists()):
+                mode = 'trigram'
+                rows = list(
+                    Product.objects.filter(title__trigram_similar=q)
+                    .annotate(similarity=TrigramSimilarity('title', q))
+                    .order_by('-similarity', 'fakestore_id')
+                    .values(*PRODUCT_VALUE_FIELDS)[offset:offset + limit + 1]
+                )
+            headers = {'X-Search-Mode': mode}
+            if len(rows) > limit:
+                rows = rows[:limit]
+                headers['X-Next-Offset'] = str(offset + limit)
+            return [format_product_row(row) for row in rows], headers
+
+        digest = hashlib.sha1(f'{fuzzy}:{q}'.encode()).hexdigest()
+        response = cached_json_response(
+            request, f'product_search:{digest}:{limit}:{offset}', build, versions=('products',)
+        )
+        if response.has_header('X-Next-Offset'):
+            params = request.GET.copy()
+            params['offset'] = response['X-Next-Offset']
+            response['Link'] = f'<{request.build_absolute_uri(request.path)}?{params.urlencode()}>; rel="next"'
+        return response
@@ -0,0 +1,15 @@
+"""Database expressions shared by the models and their migrations.
+
+Kept apart from models.py so historical migrations can import them without
+importing the live models.
+"""
+from django.db import models
+
+
+class NextVal(models.Func):
+    """nextval() of a Postgres sequence, used as a column's db_default"""
+    function = 'nextval'
+    output_field = models.IntegerField()
+
+    def __init__(self, sequence):
+        super().__init__(models.Value(sequence))
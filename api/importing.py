@@ -0,0 +1,126 @@
+"""Record sources, batching and diffing for the import_* management commands.
+
+Records come either from the FakeStore API or, with ``--from-file``, from a
+local JSON array or NDJSON file. Files are parsed incrementally, one record
+at a time, so an import only ever holds one batch of records in memory.
+``import_all`` instead fetches all three resources up front, concurrently,
+and hands each command its records.
+"""
+import json
+from itertools import islice
+
+import requests
+
+FAKESTORE_API_URL = 'https://fakestoreapi.com'
+RESOURCES = ('products', 'users', 'carts')
+DEFAULT_BATCH_SIZE = 1000
+READ_SIZE = 64 * 1024
+_SEPARATORS = ' \t\r\n,'
+
+
+def add_import_arguments(parser):
+    """Add the --from-file and --batch-size options shared by the import commands"""
+    parser.add_argument(
+        '--from-file',
+        help='Load records from a local JSON array or NDJSON file instead of the FakeStore API',
+    )
+    parser.add_argument(
+        '--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+        help=f'Records inserted per batch and transaction (default {DEFAULT_BATCH_SIZE})',
+    )
+    parser.add_argument(
+        '--sync', action='store_true',
+        help='Upsert only new and changed records and delete vanished ones, instead of reloading everything',
+    )
+
+
+def iter_records(resource, from_file=None):
+    """Yield the records of ``resource`` ('products', 'users', 'carts') from the API or a file"""
+    if from_file:
+        return iter_json_file(from_file)
+    response = requests.get(f'{FAKESTORE_API_URL}/{resource}')
+    response.raise_for_status()
+    return iter(response.json())
+
+
+def fetch_records(resource, from_file=None):
+    """Read every record of ``resource`` into a list"""
+    return list(iter_records(resource, from_file))
+
+
+def source_records(resource, options):
+    """Records for an import command: those passed in by import_all, else from iter_records"""
+    if options.get('records') is not None:
+        return iter(options['records'])
+    return iter_records(resource, options['from_file'])
+
+
+def iter_json_file(path):
+    """Yield records from a JSON array or NDJSON file without reading it whole"""
+    with open(path, encoding='utf-8') as handle:
+        first = ''
+        while not first:
+            chunk = handle.read(READ_SIZE)
+            if not chunk:
+                return
+            first = chunk.lstrip()
+        if first.startswith('['):
+            yield from _iter_json_array(handle, first[1:])
+        else:
+            handle.seek(0)
+            for number, line in enumerate(handle, 1):
+                if line.strip():
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError as e:
+                        raise ValueError(f'{path}:{number}: {e}')
+
+
+def _iter_json_array(handle, buffer):
+    decoder = json.JSONDecoder()
+    pos = 0
+    while True:
+        # Skip to the next element, refilling the buffer as needed
+        while True:
+            while pos < len(buffer) and buffer[pos] in _SEPARATORS:
+                pos += 1
+            if pos < len(buffer):
+                break
+            buffer, pos = handle.read(READ_SIZE), 0
+            if not buffer:
+                raise ValueError('Unterminated JSON array')
+        if buffer[pos] == ']':
+            return
+        # Decode one element, appending chunks until it is complete
+        while True:
+            try:
+                record, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                end = None
+            if end is not None and end < len(buffer):
+                break
+            chunk = handle.read(READ_SIZE)
+            if not chunk:
+                if end is None:
+                    raise ValueError('Malformed or truncated JSON array')
+                break
+            buffer, pos = buffer[pos:] + chunk, 0
+        yield record
+        pos = end
+
+
+def batched(records, size):
+    """Split an iterable of records into lists of at most ``size``"""
+    records = iter(records)
+    while batch := list(islice(records, size)):
+        yield batch
+
+
+def changed_fields(instance, values):
+    """Names of the fields in ``values`` that differ from ``instance``'s, compared as stored"""
+    changed = []
+    for name, value in values.items():
+        field = instance._meta.get_field(name)
+        if field.to_python(value) != getattr(instance, field.attname):
+            changed.append(name)
+    return changed
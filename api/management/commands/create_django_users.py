@@ -1,23 +1,44 @@
+import time
 from django.core.management.base import BaseCommand
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX
+from django.db import transaction
+from api.caching import invalidate_users
+from api.passwords import add_hashing_arguments, PasswordHashPool
+
+DEFAULT_PASSWORD = 'Fakestore123!'
 
 class Command(BaseCommand):
     help = 'Ensure all users have usable Django passwords; set default where missing'
 
-    def handle(self, *args, **kwargs):
+    def add_arguments(self, parser):
+        add_hashing_arguments(parser)
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Users hashed and written back per batch (default 1000)',
+        )
+
+    def handle(self, *args, **options):
         User = get_user_model()
+        started = time.monotonic()
         updated = 0
-        skipped = 0
         total = User.objects.count()
 
-        for u in User.objects.all():
-            if not u.has_usable_password():
-                u.set_password('Fakestore123!')
-                u.save(update_fields=['password'])
-                updated += 1
-            else:
-                skipped += 1
+        # Updated rows stop matching, so each pass picks up the next batch
+        unusable = User.objects.filter(password__startswith=UNUSABLE_PASSWORD_PREFIX).order_by('id')
+        with PasswordHashPool(options['workers']) as hasher:
+            while batch := list(unusable.values_list('id', 'fakestore_id')[:options['batch_size']]):
+                hashes = hasher.hash([DEFAULT_PASSWORD] * len(batch))
+                with transaction.atomic():
+                    User.objects.bulk_update(
+                        [User(id=pk, password=password) for (pk, _), password in zip(batch, hashes)],
+                        ['password'],
+                    )
+                    invalidate_users(*(fakestore_id for _, fakestore_id in batch if fakestore_id is not None))
+                updated += len(batch)
 
+        elapsed = time.monotonic() - started
         self.stdout.write(self.style.SUCCESS(
-            f'Processed {total} users: set default password for {updated}, skipped {skipped} with usable passwords'
-        ))
\ No newline at end of file
+            f'Processed {total} users: set default password for {updated}, skipped {total - updated} with usable passwords '
+            f'in {elapsed:.1f}s ({updated / elapsed if elapsed else 0:.0f} users/s)'
+        ))
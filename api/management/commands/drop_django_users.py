@@ -1,5 +1,8 @@
 from django.core.management.base import BaseCommand
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from api.models import Cart
+from api.caching import invalidate_users, invalidate_carts
 
 class Command(BaseCommand):
     help = 'Delete users (defaults to non-superusers only)'
@@ -16,5 +19,11 @@ class Command(BaseCommand):
             qs = qs.filter(is_superuser=False)
 
         count = qs.count()
-        qs.delete()
+        with transaction.atomic():
+            # The cascade removes their carts; evict both from the cache
+            user_ids = list(qs.filter(fakestore_id__isnull=False).values_list('fakestore_id', flat=True))
+            cart_ids = list(Cart.objects.filter(user__in=qs).values_list('fakestore_id', flat=True))
+            qs.delete()
+            invalidate_users(*user_ids)
+            invalidate_carts(cart_ids, user_ids)
         self.stdout.write(self.style.SUCCESS(f'Deleted {count} user(s).'))
\ No newline at end of file
@@ -0,0 +1,211 @@
+import io
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.core.management.color import no_style
+from django.db import connection, models, transaction
+from django.db.models import Max
+from api.models import Product, User, UserAddress, Cart, CartItem, sync_fakestore_id_sequence
+from api.importing import batched
+from api.management.commands.create_django_users import DEFAULT_PASSWORD
+
+CATEGORIES = ["men's clothing", "women's clothing", 'jewelery', 'electronics']
+FIRST_NAMES = ['john', 'david', 'kevin', 'don', 'derek', 'david', 'miriam', 'william', 'kate', 'jimmie']
+LAST_NAMES = ['doe', 'morrison', 'ryan', 'romer', 'powell', 'russell', 'snyder', 'hopkins', 'hale', 'kernighan']
+CITIES = ['kilcoole', 'cullman', 'san antonio', 'el paso', 'fresno', 'mesa', 'miami beach', 'san jose', 'fort wayne']
+# Generated dates fall in a fixed window so a seed always gives the same data
+START_DATE = datetime(2020, 1, 1, tzinfo=timezone.utc)
+DATE_SPAN = int(timedelta(days=5 * 365).total_seconds())
+DEFAULT_COPY_SIZE = 100000
+
+def copy_rows(model, fields, lines, batch_size):
+    """COPY tab-separated ``lines`` into the columns of ``fields``, ``batch_size`` rows per statement"""
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(model._meta.get_field(name).column) for name in fields)
+    sql = f'COPY {quote(model._meta.db_table)} ({columns}) FROM STDIN'
+    count = 0
+    with connection.cursor() as cursor:
+        for chunk in batched(lines, batch_size):
+            cursor.copy_expert(sql, io.StringIO('\n'.join(chunk) + '\n'))
+            count += len(chunk)
+    return count
+
+class Command(BaseCommand):
+    help = 'Replace the catalogue, users and carts with seeded synthetic data for scale testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=1000, help='Products to generate (default 1000)')
+        parser.add_argument('--users', type=int, default=1000, help='Users to generate (default 1000)')
+        parser.add_argument('--carts', type=int, default=10000, help='Carts to generate (default 10000)')
+        parser.add_argument(
+            '--items-per-cart', type=int, default=3,
+            help='Distinct products in every cart (default 3)',
+        )
+        parser.add_argument('--seed', type=int, default=0, help='Random seed; the same seed and sizes give the same data (default 0)')
+        parser.add_argument(
+            '--batch-size', type=int, default=DEFAULT_COPY_SIZE,
+            help=f'Rows sent per COPY statement (default {DEFAULT_COPY_SIZE})',
+        )
+
+    def handle(self, *args, **options):
+        if options['items_per_cart'] > options['products']:
+            self.stderr.write(self.style.ERROR('--items-per-cart cannot exceed --products'))
+            return
+        if options['carts'] and not options['users']:
+            self.stderr.write(self.style.ERROR('Generating carts requires at least one user'))
+            return
+
+        self.seed = options['seed']
+        self.batch_size = options['batch_size']
+        started = time.monotonic()
+        try:
+            with transaction.atomic():
+                self.clear()
+                counts = {
+                    'products': self.timed('products', self.generate_products, options['products']),
+                    'users': self.timed('users', self.generate_users, options['users']),
+                    'carts': self.timed('carts', self.generate_carts, options['carts'], options['users']),
+                    'cart items': self.timed(
+                        'cart items', self.generate_items, options['carts'], options['products'], options['items_per_cart'],
+                    ),
+                }
+                self.reset_sequences()
+                # Every cached response may describe replaced rows
+                transaction.on_commit(cache.clear)
+            # Fresh statistics, so query plans reflect the generated sizes
+            with connection.cursor() as cursor:
+                for model in (Product, UserAddress, User, Cart, CartItem):
+                    cursor.execute(f'ANALYZE {connection.ops.quote_name(model._meta.db_table)}')
+        except Exception as e:
+            self.stderr.write(self.style.ERROR(f'Failed to generate data: {str(e)}'))
+            return
+
+        elapsed = time.monotonic() - started
+        rows = sum(counts.values())
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {', '.join(f'{count} {name}' for name, count in counts.items())} "
+            f'in {elapsed:.1f}s ({rows / elapsed if elapsed else 0:.0f} rows/s)'
+        ))
+
+    def rng(self, name):
+        """A random generator per table, so changing one size leaves the other tables' data alone"""
+        return random.Random(f'{self.seed}:{name}')
+
+    def timed(self, name, generate, *args):
+        started = time.monotonic()
+        count = generate(*args)
+        self.stdout.write(f'Generated {count} {name} in {time.monotonic() - started:.1f}s')
+        return count
+
+    def clear(self):
+        """Delete all products, carts and non-superusers, like the importers do
+
+        Everything is deleted in SQL: the ORM's Collector would load every
+        user (and address) of a previous, possibly huge, run into memory.
+        """
+        quote = connection.ops.quote_name
+        user_table = quote(User._meta.db_table)
+        users = f'SELECT id FROM {user_table} WHERE NOT is_superuser'
+        with connection.cursor() as cursor:
+            cursor.execute('TRUNCATE {} RESTART IDENTITY'.format(
+                ', '.join(quote(model._meta.db_table) for model in (CartItem, Cart, Product))
+            ))
+            # Apply the on_delete of every relation to the users first, as
+            # the Collector would: group and permission links and admin log
+            # entries go with them, outstanding tokens lose their user
+            for field in User._meta.many_to_many:
+                cursor.execute(
+                    f'DELETE FROM {quote(field.remote_field.through._meta.db_table)} '
+                    f'WHERE {quote(field.m2m_column_name())} IN ({users})'
+                )
+            for relation in User._meta.related_objects:
+                table, column = quote(relation.related_model._meta.db_table), quote(relation.field.column)
+                if relation.on_delete is models.CASCADE:
+                    cursor.execute(f'DELETE FROM {table} WHERE {column} IN ({users})')
+                elif relation.on_delete is models.SET_NULL:
+                    cursor.execute(f'UPDATE {table} SET {column} = NULL WHERE {column} IN ({users})')
+            cursor.execute(f'DELETE FROM {user_table} WHERE NOT is_superuser')
+            # Retained superusers lose their address, as with import_users
+            cursor.execute(f'UPDATE {user_table} SET {quote(User._meta.get_field("address").column)} = NULL')
+            cursor.execute(f'DELETE FROM {quote(UserAddress._meta.db_table)}')
+        # Superusers keep their rows, so generated ids start after theirs
+        self.user_offset = User.objects.aggregate(Max('id'))['id__max'] or 0
+        self.address_offset = UserAddress.objects.aggregate(Max('id'))['id__max'] or 0
+
+    def generate_products(self, count):
+        rng = self.rng('products')
+        lines = (
+            f'{i}\t{i}\tProduct {i}\t{rng.randrange(100, 100000) / 100:.2f}\t'
+            f'Synthetic product {i} for scale testing\t{rng.choice(CATEGORIES)}\t'
+            f'https://fakestoreapi.com/img/{i}.jpg\t{rng.randrange(501) / 100:.2f}\t{rng.randrange(1000)}'
+            for i in range(1, count + 1)
+        )
+        fields = ['id', 'fakestore_id', 'title', 'price', 'description', 'category', 'image', 'rating_rate', 'rating_count']
+        return copy_rows(Product, fields, lines, self.batch_size)
+
+    def generate_users(self, count):
+        rng = self.rng('users')
+        # A retained superuser promoted from an API-created user may hold an
+        # id that collides with the generated ones
+        User.objects.filter(is_superuser=True, fakestore_id__range=(1, count)).update(fakestore_id=None)
+
+        address_lines = (
+            f'{self.address_offset + i}\t{rng.uniform(-90, 90):.4f}\t{rng.uniform(-180, 180):.4f}\t'
+            f'{rng.choice(CITIES)}\t{rng.randrange(1, 10000)} synthetic street\t{rng.randrange(1, 10000)}\t'
+            f'{rng.randrange(10000, 99999)}-{rng.randrange(1000, 9999)}'
+            for i in range(1, count + 1)
+        )
+        copy_rows(
+            UserAddress, ['id', 'geolocation_lat', 'geolocation_long', 'city', 'street', 'number', 'zipcode'],
+            address_lines, self.batch_size,
+        )
+
+        # Hashing is deliberately slow, so every user shares one precomputed hash
+        password = make_password(DEFAULT_PASSWORD)
+        joined = START_DATE.isoformat()
+
+        def user_lines():
+            for i in range(1, count + 1):
+                first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+                yield (
+                    f'{self.user_offset + i}\t{i}\t{self.address_offset + i}\t{password}\t{first}{i}\t'
+                    f'{first}.{last}{i}@example.com\t{first}\t{last}\t{first}\t{last}\t'
+                    f'1-{rng.randrange(100, 999)}-{rng.randrange(100, 999)}-{rng.randrange(1000, 9999)}\t'
+                    f'f\tf\tt\t{joined}'
+                )
+
+        fields = [
+            'id', 'fakestore_id', 'address', 'password', 'username', 'email', 'first_name', 'last_name',
+            'name_firstname', 'name_lastname', 'phone', 'is_superuser', 'is_staff', 'is_active', 'date_joined',
+        ]
+        return copy_rows(User, fields, user_lines(), self.batch_size)
+
+    def generate_carts(self, count, users):
+        rng = self.rng('carts')
+        lines = (
+            f'{i}\t{i}\t{self.user_offset + rng.randrange(users) + 1}\t'
+            f'{(START_DATE + timedelta(seconds=rng.randrange(DATE_SPAN))).isoformat()}'
+            for i in range(1, count + 1)
+        )
+        return copy_rows(Cart, ['id', 'fakestore_id', 'user', 'date'], lines, self.batch_size)
+
+    def generate_items(self, carts, products, per_cart):
+        rng = self.rng('cart items')
+        product_ids = range(1, products + 1)
+        lines = (
+            f'{cart_id}\t{product_id}\t{rng.randrange(1, 11)}'
+            for cart_id in range(1, carts + 1)
+            for product_id in rng.sample(product_ids, per_cart)
+        )
+        return copy_rows(CartItem, ['cart', 'product', 'quantity'], lines, self.batch_size)
+
+    def reset_sequences(self):
+        """Move the id and fakestore_id sequences past the explicitly inserted ids"""
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), [Product, UserAddress, User, Cart, CartItem]):
+                cursor.execute(sql)
+        for model in (Product, User, Cart):
+            sync_fakestore_id_sequence(model)
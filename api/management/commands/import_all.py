@@ -1,20 +1,72 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
 from django.core.management.base import BaseCommand
 from django.core.management import call_command
+from django.db import connections
+from api.importing import RESOURCES, DEFAULT_BATCH_SIZE, fetch_records
+from api.passwords import add_hashing_arguments
+from api.management.commands.import_carts import clear_carts
 
 class Command(BaseCommand):
-    help = 'Import all data from FakeStore API'
-
-    def handle(self, *args, **kwargs):
-        # First import products
-        self.stdout.write(self.style.NOTICE('Importing products...'))
-        call_command('import_products')
-        
-        # Then import users
-        self.stdout.write(self.style.NOTICE('Importing users...'))
-        call_command('import_users')
-        
-        # Finally import carts (depends on users and products)
-        self.stdout.write(self.style.NOTICE('Importing carts...'))
-        call_command('import_carts')
-        
+    help = 'Import all data from FakeStore API (or a directory of JSON/NDJSON files)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--from-dir',
+            help='Load records from products.json, users.json and carts.json in this directory instead of the FakeStore API',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+            help=f'Records inserted per batch and transaction (default {DEFAULT_BATCH_SIZE})',
+        )
+        parser.add_argument(
+            '--sync', action='store_true',
+            help='Upsert only new and changed records and delete vanished ones, instead of reloading everything',
+        )
+        add_hashing_arguments(parser)
+
+    def handle(self, *args, **options):
+        from_dir = options['from_dir']
+        command_options = {'batch_size': options['batch_size'], 'sync': options['sync'], 'stdout': self.stdout, 'stderr': self.stderr}
+
+        try:
+            # Fetch all three resources at once; each load starts as soon as
+            # its records arrive. Products and users load in parallel, carts
+            # (which reference both) once they are done.
+            with ThreadPoolExecutor(max_workers=len(RESOURCES)) as fetches, ThreadPoolExecutor(max_workers=2) as loads:
+                self.stdout.write(self.style.NOTICE('Fetching products, users and carts...'))
+                records = {
+                    resource: fetches.submit(
+                        fetch_records, resource, os.path.join(from_dir, f'{resource}.json') if from_dir else None
+                    )
+                    for resource in RESOURCES
+                }
+
+                if not options['sync']:
+                    # Deleting products and users cascades to carts; clearing
+                    # them first keeps the parallel loads from contending on
+                    # the same cart rows
+                    clear_carts()
+
+                pending = [
+                    loads.submit(self.load, 'import_products', records['products'], **command_options),
+                    loads.submit(self.load, 'import_users', records['users'], workers=options['workers'], **command_options),
+                ]
+                for load in pending:
+                    load.result()
+                self.load('import_carts', records['carts'], **command_options)
+        except Exception as e:
+            self.stderr.write(self.style.ERROR(f'Failed to import data: {str(e)}'))
+            return
+
         self.stdout.write(self.style.SUCCESS('All data imported successfully'))
+
+    def load(self, name, fetch, **options):
+        """Run one import command on the records of a fetch once it completes"""
+        try:
+            records = fetch.result()
+            self.stdout.write(self.style.NOTICE(f'Running {name} on {len(records)} fetched records...'))
+            call_command(name, records=records, **options)
+        finally:
+            # Each thread opens its own database connection
+            connections.close_all()
@@ -1,51 +1,180 @@
-import requests
 from django.core.management.base import BaseCommand
 from django.db import transaction
-from api.models import Cart, CartItem, User, Product
+from django.utils import timezone
+from api.models import Cart, CartItem, User, Product, sync_fakestore_id_sequence
+from api.caching import invalidate_carts
+from api.importing import add_import_arguments, source_records, batched
 from django.utils.dateparse import parse_datetime
 
+def clear_carts():
+    """Delete every cart and its items, invalidating their cached reads"""
+    stale = list(Cart.objects.values_list('fakestore_id', 'user__fakestore_id'))
+    Cart.objects.all().delete()
+    CartItem.objects.all().delete()
+    invalidate_carts(
+        [cart_id for cart_id, _ in stale],
+        {user_id for _, user_id in stale},
+    )
+
 class Command(BaseCommand):
-    help = 'Fetch carts from FakeStore API and save to the database'
+    help = 'Fetch carts from FakeStore API (or a local JSON/NDJSON file) and save to the database'
+
+    # Records already fetched by import_all
+    stealth_options = ('records',)
 
-    def handle(self, *args, **kwargs):
+    def add_arguments(self, parser):
+        add_import_arguments(parser)
+
+    def handle(self, *args, **options):
         try:
+            # Resolve every cart's user and products from two in-memory maps,
+            # loaded once for the whole import
+            self.users = User.objects.filter(fakestore_id__isnull=False).only('id', 'fakestore_id').in_bulk(field_name='fakestore_id')
+            self.products = Product.objects.only('id', 'fakestore_id').in_bulk(field_name='fakestore_id')
+
+            if options['sync']:
+                return self.sync(options)
+
             # Clear existing carts
-            Cart.objects.all().delete()
-            CartItem.objects.all().delete()
-            
-            # Fetch carts from FakeStore API
-            response = requests.get('https://fakestoreapi.com/carts')
-            carts = response.json()
+            clear_carts()
             
-            # Save carts to database
-            with transaction.atomic():
-                for cart_data in carts:
-                    # Get user (skip if user doesn't exist)
-                    try:
-                        user = User.objects.get(fakestore_id=cart_data.get('userId'))
-                    except User.DoesNotExist:
-                        self.stdout.write(self.style.WARNING(f"User {cart_data.get('userId')} not found, skipping cart {cart_data.get('id')}"))
-                        continue
-                    
-                    # Create cart
-                    cart = Cart.objects.create(
-                        fakestore_id=cart_data.get('id'),
-                        user=user,
-                        date=parse_datetime(cart_data.get('date')) if cart_data.get('date') else None
-                    )
-                    
-                    # Add cart items
-                    for item_data in cart_data.get('products', []):
-                        try:
-                            product = Product.objects.get(fakestore_id=item_data.get('productId'))
-                            CartItem.objects.create(
-                                cart=cart,
-                                product=product,
-                                quantity=item_data.get('quantity', 1)
-                            )
-                        except Product.DoesNotExist:
-                            self.stdout.write(self.style.WARNING(f"Product {item_data.get('productId')} not found, skipping"))
-            
-            self.stdout.write(self.style.SUCCESS(f'Successfully imported {len(carts)} carts'))
+            # Insert in batches: one transaction, and one bulk INSERT each
+            # for carts and items, per batch
+            count = 0
+            batch_size = options['batch_size']
+            for batch in batched(source_records('carts', options), batch_size):
+                count += self.load_batch(batch, batch_size)
+
+            # Rows were inserted with explicit ids; move the id sequence past them
+            sync_fakestore_id_sequence(Cart)
+
+            self.stdout.write(self.style.SUCCESS(f'Successfully imported {count} carts'))
         except Exception as e:
             self.stderr.write(self.style.ERROR(f'Failed to import carts: {str(e)}'))
+
+    def build_batch(self, batch):
+        """Build unsaved carts for one batch of records, as (cart, {product: quantity}) pairs
+
+        Carts of unknown users and lines of unknown products are skipped with
+        a warning. Carts without a date get ``date=None``.
+        """
+        carts = []
+        for cart_data in batch:
+            # Skip carts of users that do not exist
+            user = self.users.get(cart_data.get('userId'))
+            if user is None:
+                self.stdout.write(self.style.WARNING(f"User {cart_data.get('userId')} not found, skipping cart {cart_data.get('id')}"))
+                continue
+
+            cart = Cart(
+                fakestore_id=cart_data.get('id'),
+                user=user,
+                date=parse_datetime(cart_data['date']) if cart_data.get('date') else None
+            )
+
+            # A cart holds each product once; repeated lines are summed
+            quantities = {}
+            for item_data in cart_data.get('products', []):
+                product = self.products.get(item_data.get('productId'))
+                if product is None:
+                    self.stdout.write(self.style.WARNING(f"Product {item_data.get('productId')} not found, skipping"))
+                    continue
+                quantities[product] = quantities.get(product, 0) + item_data.get('quantity', 1)
+            carts.append((cart, quantities))
+        return carts
+
+    def load_batch(self, batch, batch_size):
+        """Insert one batch of FakeStore carts with their items, returning the number of carts"""
+        carts = self.build_batch(batch)
+        for cart, _ in carts:
+            cart.date = cart.date or timezone.now()
+        items = [
+            CartItem(cart=cart, product=product, quantity=quantity)
+            for cart, quantities in carts
+            for product, quantity in quantities.items()
+        ]
+
+        with transaction.atomic():
+            Cart.objects.bulk_create([cart for cart, _ in carts], batch_size=batch_size)
+            CartItem.objects.bulk_create(items, batch_size=batch_size)
+            invalidate_carts(
+                [cart.fakestore_id for cart, _ in carts],
+                {cart.user.fakestore_id for cart, _ in carts},
+            )
+        return len(carts)
+
+    def sync(self, options):
+        """Upsert new and changed carts and delete vanished ones, leaving the rest untouched
+
+        A changed cart has its items replaced; records without a date keep
+        the stored one.
+        """
+        seen = set()
+        created = updated = 0
+        batch_size = options['batch_size']
+        for batch in batched(source_records('carts', options), batch_size):
+            ids = [cart_data.get('id') for cart_data in batch]
+            seen.update(ids)
+            existing = {
+                cart_id: (user_id, date, {})
+                for cart_id, user_id, date in Cart.objects.filter(fakestore_id__in=ids).values_list(
+                    'fakestore_id', 'user__fakestore_id', 'date'
+                )
+            }
+            for cart_id, product_id, quantity in CartItem.objects.filter(cart__fakestore_id__in=ids).values_list(
+                'cart__fakestore_id', 'product__fakestore_id', 'quantity'
+            ):
+                existing[cart_id][2][product_id] = quantity
+
+            changed = []
+            user_ids = set()
+            for cart, quantities in self.build_batch(batch):
+                lines = {product.fakestore_id: quantity for product, quantity in quantities.items()}
+                current = existing.get(cart.fakestore_id)
+                if current is None:
+                    cart.date = cart.date or timezone.now()
+                    created += 1
+                else:
+                    user_id, date, current_lines = current
+                    cart.date = cart.date or date
+                    if (user_id, date, current_lines) == (cart.user.fakestore_id, cart.date, lines):
+                        continue
+                    user_ids.add(user_id)
+                    updated += 1
+                user_ids.add(cart.user.fakestore_id)
+                changed.append((cart, quantities))
+
+            if not changed:
+                continue
+            with transaction.atomic():
+                carts = [cart for cart, _ in changed]
+                Cart.objects.bulk_create(
+                    carts,
+                    batch_size=batch_size,
+                    update_conflicts=True,
+                    unique_fields=['fakestore_id'],
+                    update_fields=['user', 'date'],
+                )
+                CartItem.objects.filter(cart__in=carts).delete()
+                CartItem.objects.bulk_create([
+                    CartItem(cart=cart, product=product, quantity=quantity)
+                    for cart, quantities in changed
+                    for product, quantity in quantities.items()
+                ], batch_size=batch_size)
+                invalidate_carts([cart.fakestore_id for cart in carts], user_ids)
+
+        # Carts missing from the source are removed
+        vanished_ids = list(set(Cart.objects.values_list('fakestore_id', flat=True)) - seen)
+        with transaction.atomic():
+            vanished = Cart.objects.filter(fakestore_id__in=vanished_ids)
+            user_ids = set(vanished.values_list('user__fakestore_id', flat=True))
+            vanished.delete()
+            invalidate_carts(vanished_ids, user_ids)
+
+        # New rows were inserted with explicit ids; move the id sequence past them
+        sync_fakestore_id_sequence(Cart)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Synced carts: {created} created, {updated} updated, {len(vanished_ids)} deleted, '
+            f'{len(seen) - created - updated} unchanged'
+        ))
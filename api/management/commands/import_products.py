@@ -1,41 +1,117 @@
-import requests
+from functools import partial
 from django.core.management.base import BaseCommand
-from django.db import connection, ProgrammingError
-from api.models import Product
+from django.db import connection, transaction, ProgrammingError
+from django.core.cache import cache
+from api.models import Product, Cart, sync_fakestore_id_sequence
+from api.caching import bump_version, invalidate_carts
+from api.importing import add_import_arguments, source_records, batched, changed_fields
+
+def product_values(product_data):
+    """Model field values for one FakeStore product record"""
+    rating = product_data.get('rating', {})
+    return {
+        'title': product_data['title'],
+        'price': product_data['price'],
+        'description': product_data['description'],
+        'category': product_data['category'],
+        'image': product_data['image'],
+        'rating_rate': rating.get('rate'),
+        'rating_count': rating.get('count'),
+    }
 
 class Command(BaseCommand):
-    help = 'Fetch products from FakeStore API and save to the database'
+    help = 'Fetch products from FakeStore API (or a local JSON/NDJSON file) and save to the database'
+
+    # Records already fetched by import_all
+    stealth_options = ('records',)
+
+    def add_arguments(self, parser):
+        add_import_arguments(parser)
 
-    def handle(self, *args, **kwargs):
+    def handle(self, *args, **options):
         # Check if the product table exists
         try:
             # Try to get count of products as a lightweight way to check if table exists
             product_count = Product.objects.count()
             self.stdout.write(f"Found {product_count} existing products in database")
+            if options['sync']:
+                return self.sync(options)
             # Clear existing products if the table exists
+            stale_ids = list(Product.objects.values_list('fakestore_id', flat=True))
+            stale_categories = set(Product.objects.values_list('category', flat=True))
+            carts = list(Cart.objects.values_list('fakestore_id', 'user__fakestore_id'))
             Product.objects.all().delete()
+            # Queryset deletes skip Product.delete(), so invalidate here;
+            # cart lines were removed by the cascade
+            cache.delete_many([f'product_{pid}' for pid in stale_ids])
+            bump_version(
+                'products', 'categories',
+                *(f'product:{pid}' for pid in stale_ids),
+                *(f'category:{name}' for name in stale_categories),
+            )
+            invalidate_carts([cart_id for cart_id, _ in carts], {user_id for _, user_id in carts})
         except ProgrammingError:
             self.stdout.write(self.style.WARNING("Product table doesn't exist yet. Run migrations first with:"))
             self.stdout.write("python manage.py migrate api")
             return
         
-        # Fetch products from FakeStore API
-        response = requests.get('https://fakestoreapi.com/products')
-        products = response.json()
-        
-        # Save products to database
-        for product_data in products:
-            rating = product_data.get('rating', {})
-            
-            Product.objects.create(
-                fakestore_id=product_data['id'],
-                title=product_data['title'],
-                price=product_data['price'],
-                description=product_data['description'],
-                category=product_data['category'],
-                image=product_data['image'],
-                rating_rate=rating.get('rate'),
-                rating_count=rating.get('count')
-            )
+        # Insert in batches, one transaction and one bulk INSERT per batch
+        count = 0
+        batch_size = options['batch_size']
+        for batch in batched(source_records('products', options), batch_size):
+            products = [Product(fakestore_id=product_data['id'], **product_values(product_data)) for product_data in batch]
+            with transaction.atomic():
+                Product.objects.bulk_create(products, batch_size=batch_size)
+                # bulk_create skips Product.save(), so invalidate here
+                transaction.on_commit(partial(
+                    bump_version,
+                    'products', 'categories',
+                    *(f'product:{product.fakestore_id}' for product in products),
+                    *{f'category:{product.category}' for product in products},
+                ))
+            count += len(products)
             
-        self.stdout.write(self.style.SUCCESS(f'Successfully imported {len(products)} products'))
+        # Rows were inserted with explicit ids; move the id sequence past them
+        sync_fakestore_id_sequence(Product)
+
+        self.stdout.write(self.style.SUCCESS(f'Successfully imported {count} products'))
+
+    def sync(self, options):
+        """Upsert new and changed products and delete vanished ones, leaving the rest untouched"""
+        seen = set()
+        created = updated = 0
+        batch_size = options['batch_size']
+        for batch in batched(source_records('products', options), batch_size):
+            ids = [product_data['id'] for product_data in batch]
+            seen.update(ids)
+            existing = Product.objects.defer('search_vector').in_bulk(ids, field_name='fakestore_id')
+            products = []
+            for product_data in batch:
+                values = product_values(product_data)
+                current = existing.get(product_data['id'])
+                if current is not None and not changed_fields(current, values):
+                    continue
+                product = Product(fakestore_id=product_data['id'], **values)
+                if current is None:
+                    created += 1
+                else:
+                    # Lets upsert_many bump the old category and price versions
+                    product._loaded_category = current.category
+                    product._loaded_price = current.price
+                    updated += 1
+                products.append(product)
+            if products:
+                with transaction.atomic():
+                    Product.upsert_many(products, batch_size=batch_size)
+
+        vanished = set(Product.objects.values_list('fakestore_id', flat=True)) - seen
+        with transaction.atomic():
+            Product.delete_many(vanished)
+
+        # New rows were inserted with explicit ids; move the id sequence past them
+        sync_fakestore_id_sequence(Product)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Synced products: {created} created, {updated} updated, {len(vanished)} deleted, '
+            f'{len(seen) - created - updated} unchanged'
+        ))
@@ -1,54 +1,200 @@
-import requests
+import time
 from django.core.management.base import BaseCommand
 from django.db import transaction
-from api.models import User, UserAddress
+from api.models import User, UserAddress, Cart, sync_fakestore_id_sequence
+from api.caching import invalidate_users, invalidate_carts
+from api.importing import add_import_arguments, source_records, batched, changed_fields
+from api.passwords import add_hashing_arguments, PasswordHashPool
+
+# User columns a sync may change; passwords of existing users are kept
+SYNC_USER_FIELDS = ['username', 'email', 'first_name', 'last_name', 'phone', 'name_firstname', 'name_lastname']
+SYNC_ADDRESS_FIELDS = ['geolocation_lat', 'geolocation_long', 'city', 'street', 'number', 'zipcode']
+
+def address_values(user_data):
+    """UserAddress field values for one FakeStore user record"""
+    address_data = user_data.get('address', {})
+    geolocation = address_data.get('geolocation', {})
+    return {
+        'geolocation_lat': geolocation.get('lat'),
+        'geolocation_long': geolocation.get('long'),
+        'city': address_data.get('city', ''),
+        'street': address_data.get('street', ''),
+        'number': address_data.get('number', 0),
+        'zipcode': address_data.get('zipcode', ''),
+    }
+
+def user_values(user_data):
+    """User field values (without the password) for one FakeStore user record,
+    normalized as create_user would"""
+    name = user_data.get('name', {})
+    return {
+        'username': User.normalize_username(user_data.get('username', '')),
+        'email': User.objects.normalize_email(user_data.get('email', '')),
+        'first_name': name.get('firstname', ''),
+        'last_name': name.get('lastname', ''),
+        'phone': user_data.get('phone', ''),
+        'name_firstname': name.get('firstname', ''),
+        'name_lastname': name.get('lastname', ''),
+    }
 
 class Command(BaseCommand):
-    help = 'Fetch users from FakeStore API and save to the database'
+    help = 'Fetch users from FakeStore API (or a local JSON/NDJSON file) and save to the database'
 
-    def handle(self, *args, **kwargs):
+    # Records already fetched by import_all
+    stealth_options = ('records',)
+
+    def add_arguments(self, parser):
+        add_import_arguments(parser)
+        add_hashing_arguments(parser)
+
+    def handle(self, *args, **options):
         try:
-            # Clear existing users (non-superusers) and addresses
-            User.objects.filter(is_superuser=False).delete()
-            UserAddress.objects.all().delete()
-            
-            # Fetch users from FakeStore API
-            response = requests.get('https://fakestoreapi.com/users')
-            users = response.json()
-            
-            # Save users to database
-            with transaction.atomic():
-                for user_data in users:
-                    # Create user address
-                    address_data = user_data.get('address', {})
-                    geolocation = address_data.get('geolocation', {})
-                    
-                    address = UserAddress.objects.create(
-                        geolocation_lat=geolocation.get('lat'),
-                        geolocation_long=geolocation.get('long'),
-                        city=address_data.get('city', ''),
-                        street=address_data.get('street', ''),
-                        number=address_data.get('number', 0),
-                        zipcode=address_data.get('zipcode', '')
-                    )
-                    
-                    # Create user
-                    name = user_data.get('name', {})
-                    # Use create_user to hash password
-                    user = User.objects.create_user(
-                        username=user_data.get('username', ''),
-                        email=user_data.get('email', ''),
-                        password=user_data.get('password', ''),
-                        first_name=name.get('firstname', ''),
-                        last_name=name.get('lastname', ''),
-                    )
-                    user.fakestore_id = user_data.get('id')
-                    user.address = address
-                    user.phone = user_data.get('phone', '')
-                    user.name_firstname = name.get('firstname', '')
-                    user.name_lastname = name.get('lastname', '')
-                    user.save()
-            
-            self.stdout.write(self.style.SUCCESS(f'Successfully imported {len(users)} users'))
+            with PasswordHashPool(options['workers']) as hasher:
+                self.hasher = hasher
+                self.started = time.monotonic()
+                if options['sync']:
+                    return self.sync(options)
+                return self.load(options)
         except Exception as e:
             self.stderr.write(self.style.ERROR(f'Failed to import users: {str(e)}'))
+
+    def rate(self, count):
+        """Throughput summary since the command started"""
+        elapsed = time.monotonic() - self.started
+        return f'in {elapsed:.1f}s ({count / elapsed if elapsed else 0:.0f} users/s)'
+
+    def load(self, options):
+        """Replace all non-superusers with the imported ones"""
+        # Clear existing users (non-superusers) and addresses
+        stale_user_ids = list(User.objects.filter(is_superuser=False, fakestore_id__isnull=False).values_list('fakestore_id', flat=True))
+        stale_cart_ids = list(Cart.objects.filter(user__is_superuser=False).values_list('fakestore_id', flat=True))
+        User.objects.filter(is_superuser=False).delete()
+        UserAddress.objects.all().delete()
+
+        # Insert in batches: one transaction, and one bulk INSERT each
+        # for addresses and users, per batch
+        count = 0
+        batch_size = options['batch_size']
+        for batch in batched(source_records('users', options), batch_size):
+            self.load_batch(batch, batch_size)
+            count += len(batch)
+
+        # Carts of the removed users were deleted by the cascade
+        invalidate_users(*stale_user_ids)
+        invalidate_carts(stale_cart_ids, stale_user_ids)
+
+        # Rows were inserted with explicit ids; move the id sequence past them
+        sync_fakestore_id_sequence(User)
+
+        self.stdout.write(self.style.SUCCESS(f'Successfully imported {count} users {self.rate(count)}'))
+
+    def load_batch(self, batch, batch_size):
+        """Insert one batch of FakeStore users with their addresses"""
+        ids = [user_data.get('id') for user_data in batch]
+        addresses = [UserAddress(**address_values(user_data)) for user_data in batch]
+        # Hash the batch's passwords in parallel; pass the id explicitly so
+        # the column's sequence default is not used
+        passwords = self.hasher.hash(user_data.get('password', '') for user_data in batch)
+        users = [
+            User(fakestore_id=user_data.get('id'), password=password, **user_values(user_data))
+            for user_data, password in zip(batch, passwords)
+        ]
+
+        with transaction.atomic():
+            # A retained superuser promoted from an API-created user may hold
+            # an id that collides with the imported ones; it does not need it.
+            User.objects.filter(fakestore_id__in=ids).update(fakestore_id=None)
+            UserAddress.objects.bulk_create(addresses, batch_size=batch_size)
+            for user, address in zip(users, addresses):
+                user.address = address
+            User.objects.bulk_create(users, batch_size=batch_size)
+            invalidate_users(*ids)
+
+    def sync(self, options):
+        """Upsert new and changed users and delete vanished ones, leaving the rest untouched
+
+        Existing users keep their password hash: it cannot be compared with
+        the incoming plain-text password without re-hashing every user.
+        """
+        seen = set()
+        created = updated = 0
+        batch_size = options['batch_size']
+        for batch in batched(source_records('users', options), batch_size):
+            ids = [user_data.get('id') for user_data in batch]
+            seen.update(ids)
+            existing = User.objects.filter(is_superuser=False).select_related('address').in_bulk(ids, field_name='fakestore_id')
+            new_addresses = []
+            changed_addresses = []
+            users = []
+            touched = []
+            for user_data in batch:
+                values = user_values(user_data)
+                address = address_values(user_data)
+                current = existing.get(user_data.get('id'))
+                if current is None:
+                    # Hashed in one parallel pass below
+                    user = User(fakestore_id=user_data.get('id'), password=user_data.get('password', ''), **values)
+                    user.address = UserAddress(**address)
+                    new_addresses.append(user.address)
+                    users.append(user)
+                    created += 1
+                    continue
+
+                user_changed = bool(changed_fields(current, values))
+                address_changed = current.address is None or bool(changed_fields(current.address, address))
+                if current.address is None:
+                    current.address = UserAddress(**address)
+                    new_addresses.append(current.address)
+                    user_changed = True
+                elif address_changed:
+                    for name, value in address.items():
+                        setattr(current.address, name, value)
+                    changed_addresses.append(current.address)
+                if user_changed:
+                    # Replaces the row through the upsert below, keeping its password
+                    user = User(fakestore_id=current.fakestore_id, password=current.password, **values)
+                    user.address = current.address
+                    users.append(user)
+                if user_changed or address_changed:
+                    touched.append(current.fakestore_id)
+                    updated += 1
+
+            new_users = [user for user in users if user.fakestore_id not in existing]
+            for user, password in zip(new_users, self.hasher.hash(user.password for user in new_users)):
+                user.password = password
+
+            with transaction.atomic():
+                # A retained superuser promoted from an API-created user may
+                # hold an id that collides with the imported ones
+                User.objects.filter(is_superuser=True, fakestore_id__in=ids).update(fakestore_id=None)
+                UserAddress.objects.bulk_create(new_addresses, batch_size=batch_size)
+                UserAddress.objects.bulk_update(changed_addresses, SYNC_ADDRESS_FIELDS, batch_size=batch_size)
+                User.objects.bulk_create(
+                    users,
+                    batch_size=batch_size,
+                    update_conflicts=True,
+                    unique_fields=['fakestore_id'],
+                    update_fields=[*SYNC_USER_FIELDS, 'address'],
+                )
+                invalidate_users(*(user.fakestore_id for user in users), *touched)
+
+        # Users missing from the source are removed with their carts and addresses
+        vanished_ids = list(set(
+            User.objects.filter(is_superuser=False, fakestore_id__isnull=False).values_list('fakestore_id', flat=True)
+        ) - seen)
+        with transaction.atomic():
+            vanished = User.objects.filter(fakestore_id__in=vanished_ids)
+            cart_ids = list(Cart.objects.filter(user__in=vanished).values_list('fakestore_id', flat=True))
+            address_ids = list(vanished.exclude(address=None).values_list('address_id', flat=True))
+            vanished.delete()
+            UserAddress.objects.filter(id__in=address_ids).delete()
+            invalidate_users(*vanished_ids)
+            invalidate_carts(cart_ids, vanished_ids)
+
+        # New rows were inserted with explicit ids; move the id sequence past them
+        sync_fakestore_id_sequence(User)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Synced users: {created} created, {updated} updated, {len(vanished_ids)} deleted, '
+            f'{len(seen) - created - updated} unchanged {self.rate(len(seen))}'
+        ))
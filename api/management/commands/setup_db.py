@@ -27,11 +27,9 @@ class Command(BaseCommand):
         self.stdout.write('Cleaning up existing Django users...')
         call_command('drop_django_users', verbosity=1)
 
-        # 3) import data fresh
+        # 3) import data fresh (fetched concurrently, see import_all)
         self.stdout.write('Importing all data from FakeStore API...')
-        call_command('import_products', verbosity=1)
-        call_command('import_users', verbosity=1)
-        call_command('import_carts', verbosity=1)
+        call_command('import_all', verbosity=1)
 
         # 4) ensure passwords
         self.stdout.write('Ensuring passwords for users...')
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:42
+
+import api.expressions
+from django.db import migrations, models
+
+
+def create_sequence(table):
+    """Create <table>_fakestore_id_seq owned by the column, starting past the current max"""
+    sequence = f'{table}_fakestore_id_seq'
+    return migrations.RunSQL(
+        sql=[
+            f'CREATE SEQUENCE {sequence} OWNED BY {table}.fakestore_id;',
+            f"SELECT setval('{sequence}', COALESCE((SELECT MAX(fakestore_id) FROM {table}), 0) + 1, false);",
+        ],
+        reverse_sql=f'DROP SEQUENCE {sequence};',
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_product_title_trigram'),
+    ]
+
+    operations = [
+        create_sequence('api_cart'),
+        create_sequence('api_product'),
+        # Users get no db_default: only the user endpoints take ids from
+        # this sequence, so admins and registered accounts stay without one
+        create_sequence('api_user'),
+        migrations.AlterField(
+            model_name='cart',
+            name='fakestore_id',
+            field=models.IntegerField(db_default=api.expressions.NextVal('api_cart_fakestore_id_seq'), unique=True),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='fakestore_id',
+            field=models.IntegerField(db_default=api.expressions.NextVal('api_product_fakestore_id_seq'), unique=True),
+        ),
+    ]
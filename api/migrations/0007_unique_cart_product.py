@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_fakestore_id_sequences'),
+    ]
+
+    operations = [
+        # Merge duplicate lines into the oldest one before enforcing uniqueness
+        migrations.RunSQL(
+            sql=[
+                """
+                UPDATE api_cartitem SET quantity = dup.total
+                FROM (
+                    SELECT MIN(id) AS keep_id, SUM(quantity) AS total
+                    FROM api_cartitem GROUP BY cart_id, product_id HAVING COUNT(*) > 1
+                ) dup
+                WHERE api_cartitem.id = dup.keep_id;
+                """,
+                """
+                DELETE FROM api_cartitem a USING api_cartitem b
+                WHERE a.cart_id = b.cart_id AND a.product_id = b.product_id AND a.id > b.id;
+                """,
+            ],
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AddConstraint(
+            model_name='cartitem',
+            constraint=models.UniqueConstraint(fields=('cart', 'product'), name='unique_cart_product'),
+        ),
+    ]
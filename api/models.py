@@ -1,7 +1,31 @@
-from django.db import models
+from django.db import models, connection, transaction
 from django.utils import timezone
 from django.core.cache import cache
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+
+from .caching import bump_version, invalidate_carts
+from .expressions import NextVal
+
+def allocate_fakestore_ids(model, count):
+    """Take ``count`` ids from a model's fakestore_id sequence"""
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT nextval(%s) FROM generate_series(1, %s)', [f'{model._meta.db_table}_fakestore_id_seq', count])
+        return [row[0] for row in cursor.fetchall()]
+
+def sync_fakestore_id_sequence(model):
+    """Move a model's fakestore_id sequence past the highest stored id.
+
+    Needed after rows are inserted with explicit ids (e.g. by the import
+    commands), so later creates do not collide with them.
+    """
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT setval(%s, COALESCE((SELECT MAX(fakestore_id) FROM {connection.ops.quote_name(table)}), 0) + 1, false)",
+            [f'{table}_fakestore_id_seq'],
+        )
 
 class Product(models.Model):
     title = models.CharField(max_length=255)
@@ -11,32 +35,154 @@ class Product(models.Model):
     image = models.URLField()
     rating_rate = models.DecimalField(max_digits=3, decimal_places=2, null=True)
     rating_count = models.IntegerField(null=True)
-    fakestore_id = models.IntegerField(unique=True)
+    # Allocated by Postgres on INSERT so concurrent creates never collide
+    fakestore_id = models.IntegerField(unique=True, db_default=NextVal('api_product_fakestore_id_seq'))
+    # Stored full-text search document, maintained by Postgres on every write
+    search_vector = models.GeneratedField(
+        expression=(
+            SearchVector('title', weight='A', config='english')
+            + SearchVector('description', weight='B', config='english')
+        ),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+
+    class Meta:
+        indexes = [
+            # Keyset pagination seeks on (sort key, fakestore_id)
+            models.Index(fields=['price', 'fakestore_id'], name='product_price_id_idx'),
+            models.Index(fields=['title', 'fakestore_id'], name='product_title_id_idx'),
+            # Per-category listings, in id or price order
+            models.Index(fields=['category', 'fakestore_id'], name='product_category_id_idx'),
+            models.Index(fields=['category', 'price', 'fakestore_id'], name='product_category_price_idx'),
+            # Full-text search, and trigram matching for the typo fallback
+            GinIndex(fields=['search_vector'], name='product_search_idx'),
+            GinIndex(fields=['title'], opclasses=['gin_trgm_ops'], name='product_title_trgm_idx'),
+        ]
     
     def __str__(self):
         return self.title
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored category so save() can invalidate both the old
+        # and the new category when it changes
+        instance._loaded_category = instance.__dict__.get('category')
+        # ... and the stored price, so cart summaries are only retired when
+        # it actually changes
+        instance._loaded_price = instance.__dict__.get('price')
+        return instance
+
+    def category_versions(self):
+        """Version names to bump for the categories this product is (or was) in"""
+        previous = getattr(self, '_loaded_category', None)
+        names = {f'category:{self.category}'}
+        if previous != self.category:
+            # New product, or moved between categories: the category list may change
+            names.add('categories')
+            if previous is not None:
+                names.add(f'category:{previous}')
+        return names
         
+    def price_versions(self):
+        """Version names to bump when an existing product's price changes"""
+        previous = getattr(self, '_loaded_price', None)
+        # Compare as stored: views assign JSON floats, and 109.95 != Decimal('109.95')
+        field = self._meta.get_field('price')
+        if previous is not None and field.to_python(previous) != field.to_python(self.price):
+            # Cart summaries price their lines with the current product price
+            return {'prices'}
+        return set()
+
     def save(self, *args, **kwargs):
         """Invalidate cache when a product is saved or updated"""
-        # Invalidate product list cache
-        cache.delete('product_list')
-        
-        # Invalidate specific product cache if it exists
-        if self.fakestore_id:
-            cache.delete(f'product_{self.fakestore_id}')
-            
+        # The product_list entry is kept and retired by the version bump
+        # below, so it can be served stale while one worker rebuilds it.
         super().save(*args, **kwargs)
+
+        # Invalidate the specific product cache, every cached product list
+        # page, this product's ETag and the affected category listings once
+        # the write commits, as upsert_many does (fakestore_id is only known
+        # after the INSERT for new products)
+        key = f'product_{self.fakestore_id}'
+        versions = ['products', f'product:{self.fakestore_id}', *self.category_versions(), *self.price_versions()]
+
+        def invalidate():
+            cache.delete(key)
+            bump_version(*versions)
+        transaction.on_commit(invalidate)
+        self._loaded_category = self.category
+        self._loaded_price = self.price
         
+    @classmethod
+    def upsert_many(cls, products, batch_size=None):
+        """Insert or update ``products`` by fakestore_id with INSERT ... ON CONFLICT.
+
+        Products replacing existing rows should carry the stored category and
+        price in ``_loaded_category``/``_loaded_price`` so the right category
+        and price versions are bumped. Caches are invalidated once for the
+        whole batch, when the transaction commits.
+        """
+        cls.objects.bulk_create(
+            products,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=['fakestore_id'],
+            update_fields=['title', 'price', 'description', 'category', 'image', 'rating_rate', 'rating_count'],
+        )
+        versions = {'products'}
+        for product in products:
+            versions.add(f'product:{product.fakestore_id}')
+            versions.update(product.category_versions(), product.price_versions())
+            product._loaded_category = product.category
+            product._loaded_price = product.price
+
+        def invalidate():
+            cache.delete_many([f'product_{product.fakestore_id}' for product in products])
+            bump_version(*versions)
+        transaction.on_commit(invalidate)
+
+    @classmethod
+    def delete_many(cls, fakestore_ids):
+        """Delete products by fakestore_id, invalidating their caches and affected carts once"""
+        if not fakestore_ids:
+            return
+        products = cls.objects.filter(fakestore_id__in=fakestore_ids)
+        categories = set(products.values_list('category', flat=True))
+        # Carts holding these products lose the lines through the cascade
+        affected = list(Cart.objects.filter(items__product__in=products).values_list('fakestore_id', 'user__fakestore_id').distinct())
+        products.delete()
+
+        def invalidate():
+            cache.delete_many([f'product_{pid}' for pid in fakestore_ids])
+            bump_version(
+                'products', 'categories',
+                *(f'product:{pid}' for pid in fakestore_ids),
+                *(f'category:{name}' for name in categories),
+            )
+        transaction.on_commit(invalidate)
+        invalidate_carts([cart_id for cart_id, _ in affected], {user_id for _, user_id in affected})
+
     def delete(self, *args, **kwargs):
         """Invalidate cache when a product is deleted"""
-        # Invalidate product list cache
-        cache.delete('product_list')
-        
-        # Invalidate specific product cache
-        cache.delete(f'product_{self.fakestore_id}')
+        # Carts holding this product lose the line through the cascade
+        affected = list(Cart.objects.filter(items__product=self).values_list('fakestore_id', 'user__fakestore_id'))
         
         super().delete(*args, **kwargs)
 
+        # Invalidate the specific product cache, every cached product list
+        # page, this product's ETag and its category (which may now be empty)
+        # once the delete commits
+        key = f'product_{self.fakestore_id}'
+        versions = ['products', f'product:{self.fakestore_id}', 'categories', f'category:{self.category}']
+
+        def invalidate():
+            cache.delete(key)
+            bump_version(*versions)
+        transaction.on_commit(invalidate)
+        invalidate_carts([cart_id for cart_id, _ in affected], [user_id for _, user_id in affected])
+
 class UserAddress(models.Model):
     geolocation_lat = models.CharField(max_length=50, null=True, blank=True)
     geolocation_long = models.CharField(max_length=50, null=True, blank=True)
@@ -54,6 +200,9 @@ class User(AbstractUser):
     - Adds FakeStore fields: fakestore_id, address, phone
     - Keeps name_firstname/name_lastname for API compatibility
     """
+    # NULL for admins and registered accounts, which the unauthenticated
+    # /api/users/ endpoints must not reach; FakeStore users are given ids
+    # from api_user_fakestore_id_seq explicitly (see allocate_fakestore_ids)
     fakestore_id = models.IntegerField(unique=True, null=True, blank=True)
     address = models.ForeignKey(UserAddress, on_delete=models.SET_NULL, null=True, blank=True, related_name='users')
     phone = models.CharField(max_length=20, blank=True)
@@ -65,7 +214,7 @@ class User(AbstractUser):
         return self.username
 
 class Cart(models.Model):
-    fakestore_id = models.IntegerField(unique=True)
+    fakestore_id = models.IntegerField(unique=True, db_default=NextVal('api_cart_fakestore_id_seq'))
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='carts')
     date = models.DateTimeField(default=timezone.now)
     
@@ -76,6 +225,30 @@ class CartItem(models.Model):
     cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='items')
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cart', 'product'], name='unique_cart_product'),
+        ]
     
     def __str__(self):
         return f"{self.quantity} x {self.product.title}"
+
+    @classmethod
+    def add_quantities(cls, cart, quantities):
+        """Add ``{product_pk: n}`` to a cart in one INSERT ... ON CONFLICT statement.
+
+        Products already in the cart have their quantity incremented; the
+        others get a new line.
+        """
+        if not quantities:
+            return
+        table = connection.ops.quote_name(cls._meta.db_table)
+        rows = ', '.join(['(%s, %s, %s)'] * len(quantities))
+        params = [value for product_pk, n in quantities.items() for value in (cart.pk, product_pk, n)]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} (cart_id, product_id, quantity) VALUES {rows} '
+                f'ON CONFLICT (cart_id, product_id) DO UPDATE SET quantity = {table}.quantity + EXCLUDED.quantity',
+                params,
+            )
@@ -0,0 +1,166 @@
+"""Keyset (cursor) pagination and sparse fieldset helpers for the list endpoints.
+
+Cursors are opaque, URL-safe tokens that encode the sort order and the sort
+key values of the last row on the previous page. Seeking past that row with an
+indexed ``WHERE (key, fakestore_id) > (...)`` keeps latency flat no matter how
+deep the page is, unlike ``OFFSET``.
+"""
+import base64
+import binascii
+import json
+
+from django.db.models import Q
+
+DEFAULT_PAGE_LIMIT = 20
+MAX_PAGE_LIMIT = 100
+# OFFSET scans and discards every skipped row, so it is capped; endpoints
+# that can seek use cursors instead.
+MAX_OFFSET = 10000
+
+# Public sort names -> model fields. fakestore_id is always the tie-breaker.
+PRODUCT_SORT_FIELDS = {
+    'id': 'fakestore_id',
+    'price': 'price',
+    'title': 'title',
+}
+
+
+class PaginationError(ValueError):
+    """Raised for malformed limit, sort, cursor or fields parameters."""
+
+
+def parse_limit(value, default=DEFAULT_PAGE_LIMIT, maximum=MAX_PAGE_LIMIT):
+    """Parse a ``?limit=`` value, clamping it to ``maximum``"""
+    if value in (None, ''):
+        return default
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        raise PaginationError('limit must be an integer')
+    if limit < 1:
+        raise PaginationError('limit must be positive')
+    return min(limit, maximum)
+
+
+def parse_offset(value, maximum=MAX_OFFSET):
+    """Parse an ``?offset=`` value"""
+    if value in (None, ''):
+        return 0
+    try:
+        offset = int(value)
+    except (TypeError, ValueError):
+        raise PaginationError('offset must be an integer')
+    if offset < 0:
+        raise PaginationError('offset must not be negative')
+    if offset > maximum:
+        raise PaginationError(f'offset must not exceed {maximum}')
+    return offset
+
+
+def parse_sort(value, fields):
+    """Parse ``?sort=``, returning (sort_name, model_field, descending).
+
+    Accepts the FakeStore style ``asc``/``desc`` (by id) as well as a field
+    name from ``fields``, optionally prefixed with ``-`` for descending order.
+    """
+    if value in (None, '', 'asc'):
+        return 'id', fields['id'], False
+    if value == 'desc':
+        return '-id', fields['id'], True
+    descending = value.startswith('-')
+    name = value.removeprefix('-')
+    if name not in fields:
+        raise PaginationError(f"Unsupported sort '{value}'")
+    return value, fields[name], descending
+
+
+def encode_cursor(sort, values):
+    """Encode the sort name and last-row key values as an opaque token"""
+    payload = json.dumps({'s': sort, 'v': [str(v) for v in values]}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, sort, size):
+    """Decode a cursor produced by ``encode_cursor`` for the same sort order"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        cursor_sort, values = payload['s'], payload['v']
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise PaginationError('Invalid cursor')
+    if cursor_sort != sort or not isinstance(values, list) or len(values) != size:
+        raise PaginationError('Cursor does not match the requested sort')
+    # encode_cursor only writes strings, and no stored text holds a NUL
+    # (Postgres rejects it in a query parameter)
+    if not all(isinstance(value, str) and '\x00' not in value for value in values):
+        raise PaginationError('Invalid cursor')
+    # The last value is always the fakestore_id tie-breaker
+    try:
+        values[-1] = int(values[-1])
+    except (TypeError, ValueError):
+        raise PaginationError('Invalid cursor')
+    return values
+
+
+def keyset_page(queryset, field, descending, limit, after=None):
+    """Order ``queryset`` by (field, fakestore_id) and seek past ``after``.
+
+    Returns a queryset slice of ``limit + 1`` rows; the extra row only tells
+    the caller whether another page exists.
+    """
+    direction = 'lt' if descending else 'gt'
+    if after is not None:
+        if field == 'fakestore_id':
+            queryset = queryset.filter(**{f'fakestore_id__{direction}': after[-1]})
+        else:
+            value, last_id = after
+            queryset = queryset.filter(
+                Q(**{f'{field}__{direction}': value})
+                | Q(**{field: value, f'fakestore_id__{direction}': last_id})
+            )
+    prefix = '-' if descending else ''
+    ordering = [f'{prefix}fakestore_id'] if field == 'fakestore_id' else [f'{prefix}{field}', f'{prefix}fakestore_id']
+    return queryset.order_by(*ordering)[:limit + 1]
+
+
+def parse_fields(value, columns):
+    """Parse ``?fields=id,title`` against ``columns`` (public name -> model columns).
+
+    Returns the requested names in order, or None when every field is wanted.
+    """
+    if value in (None, ''):
+        return None
+    names = tuple(dict.fromkeys(part.strip() for part in value.split(',') if part.strip()))
+    if not names:
+        raise PaginationError('fields must not be empty')
+    for name in names:
+        if name not in columns:
+            raise PaginationError(f"Unknown field '{name}'")
+    return names
+
+
+def select_columns(columns, names, *required):
+    """Model columns to read for ``names`` (all when None), plus ``required`` ones"""
+    wanted = columns if names is None else names
+    return list(dict.fromkeys([*required, *(column for name in wanted for column in columns[name])]))
+
+
+def pick_fields(data, names):
+    """Keep only ``names`` of a formatted row (everything when None)"""
+    if names is None:
+        return data
+    return {name: data[name] for name in names}
+
+
+def fields_key(names):
+    """Cache key suffix distinguishing projections"""
+    return '' if names is None else ':' + ','.join(names)
+
+
+def set_next_link(request, response):
+    """Add a Link rel="next" header pointing at the X-Next-Cursor page, if any"""
+    if response.has_header('X-Next-Cursor'):
+        params = request.GET.copy()
+        params['cursor'] = response['X-Next-Cursor']
+        response['Link'] = f'<{request.build_absolute_uri(request.path)}?{params.urlencode()}>; rel="next"'
+    return response
@@ -0,0 +1,83 @@
+"""Password hashing across worker processes for the user import commands.
+
+Hashing with the configured hasher (PBKDF2 by default) is deliberately
+slow and CPU-bound, so hashing one user at a time in a single process
+caps an import at a few users per second. ``PasswordHashPool`` fans
+batches out to a ``ProcessPoolExecutor`` so every core is used.
+
+Requests use ``hash_passwords`` instead, which shares one bounded thread
+pool per process: hashlib's PBKDF2 releases the GIL while it runs.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+
+_thread_pool = None
+_thread_pool_lock = threading.Lock()
+
+
+def add_hashing_arguments(parser):
+    """Add the --workers option shared by the commands that hash passwords"""
+    parser.add_argument(
+        '--workers', type=int, default=os.cpu_count() or 1,
+        help='Processes used to hash passwords (default: number of CPUs; 1 hashes in-process)',
+    )
+
+
+def _hash_chunk(passwords):
+    return [make_password(password) for password in passwords]
+
+
+class PasswordHashPool:
+    """Hash lists of passwords in parallel, preserving their order
+
+    Use as a context manager so the worker processes are started once per
+    command and shut down at the end.
+    """
+
+    def __init__(self, workers):
+        self.workers = max(1, workers)
+        self._executor = None
+
+    def __enter__(self):
+        if self.workers > 1:
+            # Not forked from this process: import_all hashes from a loader
+            # thread while other threads (and the cache listener) run, and
+            # forking a multithreaded process can deadlock the children.
+            # Workers need configured settings to find the password hashers.
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('forkserver'),
+                initializer=django.setup,
+            )
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def hash(self, passwords):
+        """Return make_password(p) for every password in ``passwords``"""
+        passwords = list(passwords)
+        if self._executor is None or len(passwords) < 2:
+            return _hash_chunk(passwords)
+        # A few chunks per worker keeps them all busy until the end
+        size = max(1, -(-len(passwords) // (self.workers * 4)))
+        chunks = [passwords[i:i + size] for i in range(0, len(passwords), size)]
+        return [hashed for chunk in self._executor.map(_hash_chunk, chunks) for hashed in chunk]
+
+
+def hash_passwords(passwords):
+    """Return make_password(p) for every password in ``passwords``, hashed on
+    the process-wide pool of PASSWORD_HASH_THREADS threads"""
+    global _thread_pool
+    with _thread_pool_lock:
+        if _thread_pool is None:
+            _thread_pool = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASH_THREADS, thread_name_prefix='password-hash')
+    return list(_thread_pool.map(make_password, passwords))
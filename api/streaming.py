@@ -0,0 +1,38 @@
+"""Incremental JSON array responses for the large list endpoints.
+
+Rows are read through a server-side cursor (``QuerySet.iterator``) and
+encoded one chunk at a time, so a worker only ever holds STREAM_CHUNK_SIZE
+rows in memory and the first bytes go out before the query has finished.
+"""
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+
+def wants_stream(request):
+    """True when the client asked for a streamed response with ``?stream=1``"""
+    return request.GET.get('stream', '').lower() in ('1', 'true', 'yes')
+
+
+def _encode_array(rows, format_row, chunk_size):
+    encoder = DjangoJSONEncoder(separators=(',', ':'))
+    yield b'['
+    first = True
+    chunk = []
+    for row in rows:
+        chunk.append(encoder.encode(format_row(row)))
+        if len(chunk) >= chunk_size:
+            yield (('' if first else ',') + ','.join(chunk)).encode('utf-8')
+            first = False
+            chunk = []
+    if chunk:
+        yield (('' if first else ',') + ','.join(chunk)).encode('utf-8')
+    yield b']'
+
+
+def stream_json_array(queryset, format_row, chunk_size=None):
+    """Stream ``queryset`` as a JSON array, formatting each row with ``format_row``"""
+    chunk_size = chunk_size or settings.STREAM_CHUNK_SIZE
+    rows = queryset.iterator(chunk_size=chunk_size)
+    return StreamingHttpResponse(_encode_array(rows, format_row, chunk_size), content_type='application/json')
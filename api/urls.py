@@ -5,20 +5,29 @@ from . import db_views
 from . import user_views
 from . import cart_views
 from . import auth_views
+from . import cache_views
 
 urlpatterns = [
     # Database-backed product endpoints
     path('products/', db_views.DBProductListView.as_view(), name='product-list'),
+    path('products/bulk/', db_views.DBProductBulkView.as_view(), name='product-bulk'),
     path('products/<int:pk>/', db_views.DBProductDetailView.as_view(), name='product-detail'),
+    path('products/search/', db_views.DBProductSearchView.as_view(), name='product-search'),
+    path('products/categories/', db_views.DBProductCategoryListView.as_view(), name='product-categories'),
+    path('products/category/<str:name>/', db_views.DBCategoryProductListView.as_view(), name='category-product-list'),
     
     # Database-backed user endpoints
     path('users/', user_views.DBUserListView.as_view(), name='user-list'),
+    path('users/bulk/', user_views.DBUserBulkView.as_view(), name='user-bulk'),
     path('users/<int:pk>/', user_views.DBUserDetailView.as_view(), name='user-detail'),
     
     # Database-backed cart endpoints
     path('carts/', cart_views.DBCartListView.as_view(), name='cart-list'),
+    path('carts/bulk/', cart_views.DBCartBulkView.as_view(), name='cart-bulk'),
     path('carts/<int:pk>/', cart_views.DBCartDetailView.as_view(), name='cart-detail'),
+    path('carts/<int:pk>/summary/', cart_views.DBCartSummaryView.as_view(), name='cart-summary'),
     path('carts/user/<int:user_id>/', cart_views.DBUserCartListView.as_view(), name='user-cart-list'),
+    path('carts/user/<int:user_id>/summary/', cart_views.DBUserCartSummaryView.as_view(), name='user-cart-summary'),
     
     # JWT Authentication endpoints
     path('auth/register/', auth_views.RegisterView.as_view(), name='auth-register'),
@@ -27,4 +36,7 @@ urlpatterns = [
     path('auth/me/', auth_views.UserInfoView.as_view(), name='user-info'),
     path('auth/logout/', auth_views.LogoutView.as_view(), name='logout'),
     path('auth/logout-all/', auth_views.LogoutAllView.as_view(), name='logout_all'),
+
+    # Cache diagnostics (staff only)
+    path('cache/stats/', cache_views.CacheStatsView.as_view(), name='cache-stats'),
 ]
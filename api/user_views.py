@@ -1,53 +1,128 @@
 from django.http import JsonResponse, Http404
+from django.db import transaction
+from django.core.exceptions import ValidationError
 from django.views import View
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 import json
 
-from .models import User, UserAddress 
+from .models import User, UserAddress, allocate_fakestore_ids
+from .caching import cached_json_response, invalidate_users, invalidate_carts
+from .streaming import wants_stream, stream_json_array
+from .bulk import MAX_BULK_USERS, parse_bulk_records, created, rejected, bulk_response
+from .passwords import hash_passwords
+from .pagination import (
+    PaginationError, parse_limit, parse_fields, select_columns, pick_fields, fields_key,
+    encode_cursor, decode_cursor, keyset_page, set_next_link,
+)
+
+# Public ?fields= names -> the columns each one is built from; the address
+# join is skipped unless the address is requested
+USER_FIELD_COLUMNS = {
+    'id': ('fakestore_id',),
+    'email': ('email',),
+    'username': ('username',),
+    'name': ('name_firstname', 'name_lastname'),
+    'address': (
+        'address__city', 'address__street', 'address__number', 'address__zipcode',
+        'address__geolocation_lat', 'address__geolocation_long',
+    ),
+    'phone': ('phone',),
+}
+
+USER_VALUE_FIELDS = select_columns(USER_FIELD_COLUMNS, None)
+
+def format_user_row(row, include_password=False):
+    """Reshape a ``values()`` row into the FakeStore API user structure
+
+    Columns missing from a ``?fields=`` projection come out as None and are
+    dropped by pick_fields.
+    """
+    user = {
+        'id': row.get('fakestore_id'),
+        'email': row.get('email'),
+        'username': row.get('username'),
+    }
+    if include_password:
+        user['password'] = row['password']
+    user.update({
+        'name': {
+            'firstname': row.get('name_firstname'),
+            'lastname': row.get('name_lastname')
+        },
+        'address': {
+            'city': row.get('address__city'),
+            'street': row.get('address__street'),
+            'number': row.get('address__number'),
+            'zipcode': row.get('address__zipcode'),
+            'geolocation': {
+                'lat': row.get('address__geolocation_lat'),
+                'long': row.get('address__geolocation_long')
+            }
+        },
+        'phone': row.get('phone')
+    })
+    return user
+
+def fakestore_users():
+    """Users reachable through the API: admins and registered accounts have no fakestore_id"""
+    return User.objects.filter(fakestore_id__isnull=False)
 
 @method_decorator(csrf_exempt, name='dispatch')
 class DBUserListView(View):
     def get(self, request):
-        """Get all users from the database"""
-        users = User.objects.select_related('address').all()
-        result = []
-        
-        for user in users:
-            user_data = {
-                'id': user.fakestore_id,
-                'email': user.email,
-                'username': user.username,
-                # Do not expose password hashes
-                'name': {
-                    'firstname': user.name_firstname,
-                    'lastname': user.name_lastname
-                },
-                'address': {
-                    'city': user.address.city,
-                    'street': user.address.street,
-                    'number': user.address.number,
-                    'zipcode': user.address.zipcode,
-                    'geolocation': {
-                        'lat': user.address.geolocation_lat,
-                        'long': user.address.geolocation_long
-                    }
-                },
-                'phone': user.phone
-            }
-            result.append(user_data)
-            
-        return JsonResponse(result, safe=False)
+        """Get all users from the database with Redis caching
+
+        Supports ?fields= projections and keyset pagination with ?limit= and
+        ?cursor=. Accounts without a FakeStore id are never listed. With
+        ``?stream=1`` the array is streamed from a server-side cursor
+        instead, keeping worker memory bounded for very large tables.
+        """
+        try:
+            fields = parse_fields(request.GET.get('fields'), USER_FIELD_COLUMNS)
+        except PaginationError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        columns = select_columns(USER_FIELD_COLUMNS, fields)
+
+        if wants_stream(request):
+            rows = fakestore_users().values(*columns).order_by('id')
+            return stream_json_array(rows, lambda row: pick_fields(format_user_row(row), fields))
+        if 'limit' in request.GET or 'cursor' in request.GET:
+            return self.get_page(request, fields)
+
+        def build():
+            rows = fakestore_users().values(*columns).order_by('id')
+            return [pick_fields(format_user_row(row), fields) for row in rows], None
+
+        return cached_json_response(request, 'user_list' + fields_key(fields), build, versions=('users',))
+
+    def get_page(self, request, fields):
+        """Serve one page of users ordered by id (?limit=, ?cursor=)"""
+        try:
+            limit = parse_limit(request.GET.get('limit'))
+            cursor = request.GET.get('cursor') or None
+            after = decode_cursor(cursor, 'id', 1) if cursor else None
+        except PaginationError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+        def build():
+            columns = select_columns(USER_FIELD_COLUMNS, fields, 'fakestore_id')
+            rows = list(keyset_page(fakestore_users().values(*columns), 'fakestore_id', False, limit, after))
+            headers = {}
+            if len(rows) > limit:
+                rows = rows[:limit]
+                headers['X-Next-Cursor'] = encode_cursor('id', [rows[-1]['fakestore_id']])
+            return [pick_fields(format_user_row(row), fields) for row in rows], headers
+
+        cache_key = f"user_page:{limit}:{cursor or ''}{fields_key(fields)}"
+        response = cached_json_response(request, cache_key, build, versions=('users',))
+        return set_next_link(request, response)
     
     def post(self, request):
         """Create a new user in the database"""
         try:
             data = json.loads(request.body)
             
-            # Find the highest fakestore_id and add 1
-            max_id = User.objects.all().order_by('-fakestore_id').first()
-            new_id = (max_id.fakestore_id + 1) if max_id else 1
-            
             # Create address
             address_data = data.get('address', {})
             geolocation = address_data.get('geolocation', {})
@@ -61,21 +136,23 @@ class DBUserListView(View):
                 zipcode=address_data.get('zipcode', '')
             )
             
-            # Create user
+            # Create user in a single INSERT, with the next id from the
+            # fakestore_id sequence
             name = data.get('name', {})
-            user = User.objects.create_user(
-                username=data.get('username', ''),
-                email=data.get('email', ''),
-                password=data.get('password', ''),
+            user = User(
+                fakestore_id=allocate_fakestore_ids(User, 1)[0],
+                username=User.normalize_username(data.get('username', '')),
+                email=User.objects.normalize_email(data.get('email', '')),
                 first_name=name.get('firstname', ''),
                 last_name=name.get('lastname', ''),
+                address=address,
+                phone=data.get('phone', ''),
+                name_firstname=name.get('firstname', ''),
+                name_lastname=name.get('lastname', ''),
             )
-            user.fakestore_id = new_id
-            user.address = address
-            user.phone = data.get('phone', '')
-            user.name_firstname = name.get('firstname', '')
-            user.name_lastname = name.get('lastname', '')
+            user.set_password(data.get('password', ''))
             user.save()
+            invalidate_users(user.fakestore_id)
             
             # Format response
             response_data = {
@@ -104,39 +181,154 @@ class DBUserListView(View):
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=400)
 
+def clean_columns(instance, exclude=()):
+    """Convert the instance's set column values and run their validators (max
+    lengths etc.), so a value the column cannot hold raises ValidationError
+    instead of failing the whole INSERT. Blank values are allowed."""
+    for field in instance._meta.concrete_fields:
+        if field.primary_key or field.is_relation or field.name in exclude:
+            continue
+        value = getattr(instance, field.attname)
+        if value is None:
+            continue
+        try:
+            value = field.to_python(value)
+            field.run_validators(value)
+        except ValidationError as e:
+            raise ValidationError(f"{field.name}: {'; '.join(e.messages)}")
+        setattr(instance, field.attname, value)
+
+def build_bulk_user(record, username):
+    """Build the unsaved address and user of one bulk record
+
+    Raises ValidationError when the record is malformed or a value does not
+    fit its column. The password is hashed later, for the whole batch.
+    """
+    for key in ('name', 'address'):
+        if not isinstance(record.get(key) or {}, dict):
+            raise ValidationError(f'{key} must be an object')
+    address_data = record.get('address') or {}
+    geolocation = address_data.get('geolocation') or {}
+    if not isinstance(geolocation, dict):
+        raise ValidationError('address.geolocation must be an object')
+    for key in ('email', 'password', 'phone'):
+        if not isinstance(record.get(key) or '', str):
+            raise ValidationError(f'{key} must be a string')
+
+    address = UserAddress(
+        geolocation_lat=geolocation.get('lat'),
+        geolocation_long=geolocation.get('long'),
+        city=address_data.get('city', ''),
+        street=address_data.get('street', ''),
+        number=address_data.get('number', 0),
+        zipcode=address_data.get('zipcode', '')
+    )
+    clean_columns(address)
+    name = record.get('name') or {}
+    user = User(
+        username=username,
+        email=User.objects.normalize_email(record.get('email') or ''),
+        first_name=name.get('firstname', ''),
+        last_name=name.get('lastname', ''),
+        phone=record.get('phone') or '',
+        name_firstname=name.get('firstname', ''),
+        name_lastname=name.get('lastname', ''),
+    )
+    # The single-user POST does not apply the username and email format
+    # validators either, so only their lengths are checked
+    clean_columns(user, exclude={'password', 'username', 'email'})
+    for field in ('username', 'email'):
+        max_length = User._meta.get_field(field).max_length
+        if len(getattr(user, field)) > max_length:
+            raise ValidationError(f'{field} must be at most {max_length} characters')
+    return address, user
+
 @method_decorator(csrf_exempt, name='dispatch')
-class DBUserDetailView(View):
-    def get(self, request, pk):
-        """Get a user by ID from the database"""
+class DBUserBulkView(View):
+    def post(self, request):
+        """Create many users, with their addresses, in one transaction
+
+        Usernames are checked against the database with one query. Addresses
+        and then users are inserted with one bulk_create each; records that
+        fail validation are reported without blocking the rest.
+        """
         try:
-            user = User.objects.select_related('address').get(fakestore_id=pk)
-            
-            # Format response
-            response_data = {
-                'id': user.fakestore_id,
+            records = parse_bulk_records(request, limit=MAX_BULK_USERS)
+        except Exception as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+        usernames = [User.normalize_username(str(record.get('username') or '')) for record in records]
+        taken = set(User.objects.filter(username__in=[name for name in usernames if name]).values_list('username', flat=True))
+        results = [None] * len(records)
+        pending = []
+        for index, (record, username) in enumerate(zip(records, usernames)):
+            if not username:
+                results[index] = rejected('username is required')
+            elif username in taken:
+                results[index] = rejected(f"Username '{username}' is already taken")
+            else:
+                taken.add(username)
+                pending.append((index, record, username))
+
+        # Build and validate each record on its own, so a malformed one is
+        # rejected without failing the batch
+        valid = []
+        users = []
+        addresses = []
+        for index, record, username in pending:
+            try:
+                address, user = build_bulk_user(record, username)
+            except ValidationError as e:
+                results[index] = rejected('; '.join(e.messages))
+                continue
+            valid.append((index, record, username))
+            addresses.append(address)
+            users.append(user)
+        pending = valid
+
+        try:
+            # Hash the batch's passwords in parallel
+            passwords = hash_passwords(record.get('password', '') for _, record, _ in pending)
+            for user, password in zip(users, passwords):
+                user.password = password
+
+            with transaction.atomic():
+                # Addresses first so their primary keys can be linked
+                UserAddress.objects.bulk_create(addresses)
+                for user, address in zip(users, addresses):
+                    user.address = address
+                for user, fakestore_id in zip(users, allocate_fakestore_ids(User, len(users))):
+                    user.fakestore_id = fakestore_id
+                User.objects.bulk_create(users)
+                invalidate_users(*(user.fakestore_id for user in users))
+        except Exception as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+        for (index, _, _), user in zip(pending, users):
+            results[index] = created(format_user_row({
+                'fakestore_id': user.fakestore_id,
                 'email': user.email,
                 'username': user.username,
-                'password': user.password,
-                'name': {
-                    'firstname': user.name_firstname,
-                    'lastname': user.name_lastname
-                },
-                'address': {
-                    'city': user.address.city,
-                    'street': user.address.street,
-                    'number': user.address.number,
-                    'zipcode': user.address.zipcode,
-                    'geolocation': {
-                        'lat': user.address.geolocation_lat,
-                        'long': user.address.geolocation_long
-                    }
-                },
-                'phone': user.phone
-            }
-            
-            return JsonResponse(response_data)
-        except User.DoesNotExist:
-            raise Http404('User not found')
+                'name_firstname': user.name_firstname,
+                'name_lastname': user.name_lastname,
+                'phone': user.phone,
+                **{f'address__{field}': getattr(user.address, field) for field in (
+                    'city', 'street', 'number', 'zipcode', 'geolocation_lat', 'geolocation_long'
+                )},
+            }))
+        return bulk_response(results)
+
+@method_decorator(csrf_exempt, name='dispatch')
+class DBUserDetailView(View):
+    def get(self, request, pk):
+        """Get a user by ID from the database with Redis caching"""
+        def build():
+            row = User.objects.filter(fakestore_id=pk).values('password', *USER_VALUE_FIELDS).first()
+            if row is None:
+                raise Http404('User not found')
+            return format_user_row(row, include_password=True), None
+
+        return cached_json_response(request, f'user_{pk}', build, versions=(f'user:{pk}',))
             
     def put(self, request, pk):
         """Update a user completely"""
@@ -164,9 +356,11 @@ class DBUserDetailView(View):
             user.address.geolocation_lat = geolocation.get('lat', user.address.geolocation_lat)
             user.address.geolocation_long = geolocation.get('long', user.address.geolocation_long)
             
-            # Save changes
-            user.address.save()
-            user.save()
+            # Save changes; cached reads are evicted once they are committed
+            with transaction.atomic():
+                user.address.save()
+                user.save()
+                invalidate_users(pk)
             
             # Format response
             response_data = {
@@ -221,31 +415,34 @@ class DBUserDetailView(View):
                 if 'lastname' in name:
                     user.name_lastname = name['lastname']
 
-            # Address (nested)
-            if 'address' in data:
-                addr_payload = data['address'] or {}
-                address = user.address
-                # If user has no address yet and payload has something, create one
-                if not address:
-                    address = UserAddress.objects.create()
-                    user.address = address
-                if 'city' in addr_payload:
-                    address.city = addr_payload['city']
-                if 'street' in addr_payload:
-                    address.street = addr_payload['street']
-                if 'number' in addr_payload:
-                    address.number = addr_payload['number']
-                if 'zipcode' in addr_payload:
-                    address.zipcode = addr_payload['zipcode']
-                if 'geolocation' in addr_payload:
-                    geo = addr_payload['geolocation'] or {}
-                    if 'lat' in geo:
-                        address.geolocation_lat = geo['lat']
-                    if 'long' in geo:
-                        address.geolocation_long = geo['long']
-                address.save()
+            # Save changes; cached reads are evicted once they are committed
+            with transaction.atomic():
+                # Address (nested)
+                if 'address' in data:
+                    addr_payload = data['address'] or {}
+                    address = user.address
+                    # If user has no address yet and payload has something, create one
+                    if not address:
+                        address = UserAddress.objects.create()
+                        user.address = address
+                    if 'city' in addr_payload:
+                        address.city = addr_payload['city']
+                    if 'street' in addr_payload:
+                        address.street = addr_payload['street']
+                    if 'number' in addr_payload:
+                        address.number = addr_payload['number']
+                    if 'zipcode' in addr_payload:
+                        address.zipcode = addr_payload['zipcode']
+                    if 'geolocation' in addr_payload:
+                        geo = addr_payload['geolocation'] or {}
+                        if 'lat' in geo:
+                            address.geolocation_lat = geo['lat']
+                        if 'long' in geo:
+                            address.geolocation_long = geo['long']
+                    address.save()
 
-            user.save()
+                user.save()
+                invalidate_users(pk)
 
             response_data = {
                 'id': user.fakestore_id,
@@ -287,12 +484,17 @@ class DBUserDetailView(View):
             
             # Get the address to delete separately
             address = user.address
+
+            # The user's carts are removed by the cascade
+            cart_ids = list(user.carts.values_list('fakestore_id', flat=True))
             
-            # Delete user
-            user.delete()
-            
-            # Delete the address
-            address.delete()
+            # Delete user and address; cached reads are evicted once committed
+            with transaction.atomic():
+                user.delete()
+                if address:
+                    address.delete()
+                invalidate_users(pk)
+                invalidate_carts(cart_ids, [pk])
             
             return JsonResponse(response_data)
         except User.DoesNotExist:
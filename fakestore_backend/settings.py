@@ -38,6 +38,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework_simplejwt',
     'rest_framework_simplejwt.token_blacklist',
@@ -154,17 +155,42 @@ SIMPLE_JWT = {
 AUTH_USER_MODEL = 'api.User'
 
 # Redis Cache Configuration
+# Each worker keeps a small in-process LRU in front of Redis; writes are
+# broadcast over pub/sub so every worker evicts its local copy.
 CACHES = {
     "default": {
-        "BACKEND": "django_redis.cache.RedisCache",
+        "BACKEND": "api.cache_backends.TwoTierRedisCache",
         "LOCATION": os.getenv('REDIS_URL', 'redis://localhost:6379/1'),
         "OPTIONS": {
             "CLIENT_CLASS": "django_redis.client.DefaultClient",
-        }
+            "LOCAL_MAX_ENTRIES": int(os.getenv('LOCAL_CACHE_MAX_ENTRIES', '1024')),
+            "LOCAL_TTL": int(os.getenv('LOCAL_CACHE_TTL', '5')),
+            "INVALIDATION_CHANNEL": "fakestore:cache-invalidation",
+        },
+        # Bumped when the format of cached values changes
+        "VERSION": 3,
     }
 }
 
 # Cache time to live is 15 minutes (in seconds)
 CACHE_TTL = 60 * 15
 
+# Cached JSON bodies at least this large are stored gzip-compressed
+CACHE_COMPRESS_MIN_BYTES = 1024
+
+# Stampede protection for cached responses: entries are kept CACHE_STALE_TTL
+# seconds past expiry so they can be served while one worker holds the
+# rebuild lease (CACHE_LOCK_TIMEOUT); workers with nothing to serve wait for
+# the entry while the lease is held. Higher beta refreshes earlier before expiry.
+CACHE_STALE_TTL = 60 * 5
+CACHE_LOCK_TIMEOUT = 30
+CACHE_EARLY_REFRESH_BETA = 1.0
+
+# Rows fetched per server-side cursor round trip for ?stream=1 list responses
+STREAM_CHUNK_SIZE = 2000
+
+# Threads per process hashing passwords for POST /api/users/bulk/
+# (PBKDF2 releases the GIL, so they run on separate cores)
+PASSWORD_HASH_THREADS = int(os.getenv('PASSWORD_HASH_THREADS', str(os.cpu_count() or 1)))
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'